@@ -10,6 +10,7 @@ from googleapiclient.errors import HttpError
 import datetime
 import time
 import json # Import for JSON operations
+from message_cache import MessageCache # Persistent parsed-email cache shared by the analyze scripts
 
 # You'll need to install these (which you've already done!):
 # pip install google-api-python-client google-auth-oauthlib google-auth-httplib2
@@ -173,6 +174,7 @@ def analyze_gmail_messages():
         key_people = Counter()
         key_organizations = Counter()
         all_processed_emails_data = [] # Stores structured data for each email
+        message_cache = MessageCache("analyze", 1) # Parsed emails from earlier runs, keyed by message id
 
         next_page_token = None
         total_messages_processed = 0
@@ -240,69 +242,76 @@ def analyze_gmail_messages():
                 msg_id = message["id"]
                 thread_id = message["threadId"]
                 
-                try:
-                    # Fetch the full message content
-                    msg = service.users().messages().get(userId="me", id=msg_id, format="full").execute()
-                    time.sleep(0.2) # Add a small delay after each message fetch
-                except HttpError as e:
-                    print(f"Error fetching message ID {msg_id}: {e}. Skipping this message.")
-                    continue
-                except Exception as e:
-                        print(f"An unexpected error occurred while fetching message ID {msg_id}: {e}. Skipping this message.")
+                email_data = message_cache.get(msg_id)
+                if email_data is None:
+                    try:
+                        # Fetch the full message content
+                        msg = service.users().messages().get(userId="me", id=msg_id, format="full").execute()
+                        time.sleep(0.2) # Add a small delay after each message fetch
+                    except HttpError as e:
+                        print(f"Error fetching message ID {msg_id}: {e}. Skipping this message.")
                         continue
-
-
-                headers = msg["payload"]["headers"]
-                subject = ""
-                sender_email = ""
-                sender_name = ""
-                to_recipients = []
-                cc_recipients = []
-                date_sent = ""
-                has_attachments = 'attachmentId' in str(msg["payload"]) # Simple heuristic for attachments
-
-                for header in headers:
-                    if header["name"] == "Subject":
-                        subject = decode_email_header(header["value"])
-                    elif header["name"] == "From":
-                        sender_raw = header["value"]
-                        sender_name_match = re.match(r'^(.*?)\s*<([^>]+)>', sender_raw)
-                        if sender_name_match:
-                            sender_name = decode_email_header(sender_name_match.group(1).strip())
-                            sender_email = sender_name_match.group(2)
-                        else:
-                            sender_email = decode_email_header(sender_raw)
-                            sender_name = sender_email # Fallback if no name found
-                    elif header["name"] == "To":
-                        to_recipients = [decode_email_header(r.strip()) for r in header["value"].split(',')]
-                    elif header["name"] == "Cc":
-                        cc_recipients = [decode_email_header(r.strip()) for r in header["value"].split(',')]
-                    elif header["name"] == "Date":
-                        date_sent = decode_email_header(header["value"])
-
-
-                body = get_email_body_from_gmail_api_payload(msg["payload"])
-                cleaned_body = clean_text(body)
+                    except Exception as e:
+                            print(f"An unexpected error occurred while fetching message ID {msg_id}: {e}. Skipping this message.")
+                            continue
+
+
+                    headers = msg["payload"]["headers"]
+                    subject = ""
+                    sender_email = ""
+                    sender_name = ""
+                    to_recipients = []
+                    cc_recipients = []
+                    date_sent = ""
+                    has_attachments = 'attachmentId' in str(msg["payload"]) # Simple heuristic for attachments
+
+                    for header in headers:
+                        if header["name"] == "Subject":
+                            subject = decode_email_header(header["value"])
+                        elif header["name"] == "From":
+                            sender_raw = header["value"]
+                            sender_name_match = re.match(r'^(.*?)\s*<([^>]+)>', sender_raw)
+                            if sender_name_match:
+                                sender_name = decode_email_header(sender_name_match.group(1).strip())
+                                sender_email = sender_name_match.group(2)
+                            else:
+                                sender_email = decode_email_header(sender_raw)
+                                sender_name = sender_email # Fallback if no name found
+                        elif header["name"] == "To":
+                            to_recipients = [decode_email_header(r.strip()) for r in header["value"].split(',')]
+                        elif header["name"] == "Cc":
+                            cc_recipients = [decode_email_header(r.strip()) for r in header["value"].split(',')]
+                        elif header["name"] == "Date":
+                            date_sent = decode_email_header(header["value"])
+
+
+                    body = get_email_body_from_gmail_api_payload(msg["payload"])
+                    cleaned_body = clean_text(body)
+
+                    # Store all extracted email data
+                    email_data = {
+                        'id': msg_id,
+                        'threadId': thread_id,
+                        'subject': subject,
+                        'from_name': sender_name,
+                        'from_email': sender_email,
+                        'to_recipients': to_recipients,
+                        'cc_recipients': cc_recipients,
+                        'date': date_sent,
+                        'body': cleaned_body,
+                        'has_attachments': has_attachments
+                    }
+                    message_cache.put(email_data)
 
                 # Secondary local filter (in case API filter missed something)
-                if is_marketing_email(cleaned_body, subject, sender_email):
+                if is_marketing_email(email_data['body'], email_data['subject'], email_data['from_email']):
                     # print(f"Secondary filter skipped marketing email: {subject}") # Uncomment for verbose skipping
                     continue
 
-                # Store all extracted email data
-                email_data = {
-                    'id': msg_id,
-                    'threadId': thread_id,
-                    'subject': subject,
-                    'from_name': sender_name,
-                    'from_email': sender_email,
-                    'to_recipients': to_recipients,
-                    'cc_recipients': cc_recipients,
-                    'date': date_sent,
-                    'body': cleaned_body,
-                    'has_attachments': has_attachments
-                }
                 all_processed_emails_data.append(email_data)
+                sender_name = email_data['from_name']
+                sender_email = email_data['from_email']
+                cleaned_body = email_data['body']
 
                 # Update key people and organizations based on this email
                 if sender_name and sender_email:
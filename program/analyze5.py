@@ -130,15 +130,22 @@ async def fetch_and_process_calendar_events(service, time_min, time_max):
     time_max_str = time_max.isoformat(timespec='seconds').replace('+00:00', 'Z')
 
     try:
-        events_result = service.events().list(
-            calendarId='primary',
-            timeMin=time_min_str,
-            timeMax=time_max_str,
-            maxResults=100,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        events = events_result.get('items', [])
+        events = []
+        page_token = None
+        while True:
+            events_result = service.events().list(
+                calendarId='primary',
+                timeMin=time_min_str,
+                timeMax=time_max_str,
+                maxResults=250,
+                singleEvents=True,
+                orderBy='startTime',
+                pageToken=page_token
+            ).execute()
+            events.extend(events_result.get('items', []))
+            page_token = events_result.get('nextPageToken')
+            if not page_token:
+                break
         for event in events:
             event_data = {
                 'id': event.get('id'),
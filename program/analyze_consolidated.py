@@ -1,14 +1,20 @@
 import os
 import base64
 import re
+import html
 import json
 import datetime
 import time
 import logging
 import asyncio
+import random
+import threading
+from functools import lru_cache
 from collections import Counter, defaultdict
 from email.header import decode_header
-from email.utils import make_msgid, parsedate_to_datetime
+from email import policy
+from email.parser import BytesParser
+from email.utils import getaddresses, make_msgid, parsedate_to_datetime
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
@@ -31,6 +37,20 @@ from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+import google_auth_httplib2
+import httplib2
+
+from message_cache import MessageCache
+from calendar_index import CalendarIndex
+from calendar_analytics import compute_meeting_analytics
+from calendar_recurrence import expand_recurring_events
+from participant_index import ParticipantIndex
+from contact_table import ContactTable
+from email_cleaning import clean_text, split_reply
+from signature_templates import SignatureTemplates
+from bulk_classifier import BulkMailClassifier
+from sender_reputation import SenderReputation
+from marketing_rules import MarketingMatcher, DEFAULT_MARKETING_KEYWORDS, DEFAULT_MARKETING_SENDER_PATTERNS
 
 # Load environment variables
 load_dotenv()
@@ -51,6 +71,61 @@ SCOPES = [
 TOKEN_FILE = "token.json"
 CREDENTIALS_FILE = "credentials.json"
 
+# Gmail allows up to 100 calls per batch request but recommends no more than 50
+GMAIL_BATCH_SIZE = 50
+
+# Headers and JSON fields requested in the metadata triage phase; bodies are only fetched for survivors
+TRIAGE_METADATA_HEADERS = ["From", "Subject", "To", "Cc", "Date", "List-Unsubscribe", "List-Id", "Precedence"]
+TRIAGE_MESSAGE_FIELDS = "id,threadId,payload/headers"
+FULL_MESSAGE_FIELDS = "id,threadId,internalDate,payload"
+RAW_MESSAGE_FIELDS = "id,threadId,internalDate,raw"
+
+# Email fields sent to the LLM and saved with the briefing data; internal ids and parse bookkeeping stay out
+LLM_EMAIL_FIELDS = ('id', 'threadId', 'subject', 'from_name', 'from_email', 'to_recipients', 'cc_recipients', 'date', 'body', 'has_attachments')
+
+# "full" walks Gmail's JSON part tree; "raw" downloads RFC 822 bytes and parses them in one pass
+GMAIL_MESSAGE_FORMAT = os.getenv("GMAIL_MESSAGE_FORMAT", "full").lower()
+FULL_THREAD_FIELDS = "id,messages(id,threadId,internalDate,payload)"
+
+# Persistent parsed-message cache; bump PARSED_EMAIL_SCHEMA_VERSION whenever parse_gmail_message output changes
+MESSAGE_CACHE_ENABLED = os.getenv("MESSAGE_CACHE_ENABLED", "true").lower() == "true"
+PARSED_EMAIL_SCHEMA_VERSION = 10
+
+# Per-sender signature/disclaimer templates learned from trailing lines and stripped at ingest
+SIGNATURE_STRIPPING_ENABLED = os.getenv("SIGNATURE_STRIPPING_ENABLED", "true").lower() == "true"
+
+# Incremental Calendar sync: nextSyncToken plus a local event store
+CALENDAR_SYNC_STATE_FILE = os.getenv("CALENDAR_SYNC_STATE_FILE", "calendar_sync_state.json")
+CALENDAR_INCREMENTAL_SYNC = os.getenv("CALENDAR_INCREMENTAL_SYNC", "true").lower() == "true"
+CALENDAR_SYNC_LOOKBACK_DAYS = int(os.getenv("CALENDAR_SYNC_LOOKBACK_DAYS", 30))
+CALENDAR_PAGE_SIZE = 250
+# Fetch recurring masters (singleEvents=False) and expand their RRULEs locally instead of server-side
+CALENDAR_EXPAND_RECURRING_LOCALLY = os.getenv("CALENDAR_EXPAND_RECURRING_LOCALLY", "false").lower() == "true"
+# "selected" reads every calendar selected in calendarList; "primary" reads only the primary calendar
+CALENDAR_SCOPE = os.getenv("CALENDAR_SCOPE", "selected").lower()
+
+# "messages" fetches one request per message; "threads" fetches one request per conversation
+GMAIL_INGESTION_MODE = os.getenv("GMAIL_INGESTION_MODE", "messages").lower()
+
+# Sharded listing: a date shard that needs more than one page is split in half
+# until it is no wider than MIN_LIST_SHARD_SECONDS, then paged normally
+LIST_PAGE_SIZE = 500
+MIN_LIST_SHARD_SECONDS = 3600
+
+# Concurrent ingestion: Gmail allows 250 quota units per user per second;
+# messages.get/list cost 5 units each, history.list and getProfile cost 2 and 1.
+GMAIL_CONCURRENCY = int(os.getenv("GMAIL_CONCURRENCY", 4))
+GMAIL_QUOTA_UNITS_PER_SECOND = int(os.getenv("GMAIL_QUOTA_UNITS_PER_SECOND", 250))
+GMAIL_QUOTA_UNITS = {'messages.get': 5, 'messages.list': 5, 'threads.get': 10, 'threads.list': 10, 'history.list': 2, 'getProfile': 1}
+CALENDAR_REQUESTS_PER_SECOND = int(os.getenv("CALENDAR_REQUESTS_PER_SECOND", 10))
+RETRYABLE_HTTP_STATUSES = {429, 500, 503}
+MAX_REQUEST_RETRIES = 5
+
+# Incremental Gmail sync: last historyId plus already-parsed messages
+GMAIL_SYNC_STATE_FILE = os.getenv("GMAIL_SYNC_STATE_FILE", "gmail_sync_state.json")
+GMAIL_INCREMENTAL_SYNC = os.getenv("GMAIL_INCREMENTAL_SYNC", "true").lower() == "true"
+EXCLUDED_GMAIL_CATEGORIES = {"CATEGORY_PROMOTIONS", "CATEGORY_SOCIAL", "CATEGORY_UPDATES", "CATEGORY_FORUMS"}
+
 # Required environment variables
 REQUIRED_ENV_VARS = [
     "SENDER_EMAIL_ADDRESS",
@@ -79,6 +154,7 @@ def validate_env_vars():
         raise EnvironmentError(f"Missing required environment variables: {', '.join(missing)}")
 
 # NLP Initialization
+@lru_cache(maxsize=1)
 def load_spacy_model():
     try:
         return spacy.load("en_core_web_sm")
@@ -104,19 +180,41 @@ class LLMGenerationError(Exception):
     pass
 
 # Helper Functions
-def clean_text(text):
-    """Removes common email artifacts and cleans text for NLP."""
-    text = re.sub(r'Subject:.*', '', text, flags=re.DOTALL)
-    text = re.sub(r'From:.*', '', text, flags=re.DOTALL)
-    text = re.sub(r'To:.*', '', text, flags=re.DOTALL)
-    text = re.sub(r'Date:.*', '', text, flags=re.DOTALL)
-    text = re.sub(r'Content-Type:.*', '', text, flags=re.DOTALL)
-    text = re.sub(r'[\r\n]+', ' ', text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+def parse_email_timestamp(date_header):
+    """Parses a Date header into epoch seconds (offset-less dates count as UTC), or None if it is invalid."""
+    try:
+        parsed = parsedate_to_datetime(date_header)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return int(parsed.timestamp())
+
+def email_epoch(email_entry):
+    """Returns an email's parse-time 'timestamp', parsing its Date header only for older records without one."""
+    if 'timestamp' in email_entry:
+        return email_entry['timestamp']
+    return parse_email_timestamp(email_entry.get('date'))
+
+# Bounded cache of decoded RFC 2047 header values; display names and subjects repeat across a mailbox
+HEADER_DECODE_CACHE_SIZE = int(os.getenv("HEADER_DECODE_CACHE_SIZE", 4096))
+header_decode_stats = {'fast_path': 0}
 
 def decode_email_header(header):
-    """Decodes email headers which can be encoded in various ways."""
+    """
+    Decodes email headers which can be encoded in various ways.
+    Values without "=?" encoded words are returned as they are; the rest go through a
+    bounded LRU cache shared by every ingestion path.
+    """
+    if '=?' not in header:
+        header_decode_stats['fast_path'] += 1
+        return header
+    return decode_encoded_header(header)
+
+@lru_cache(maxsize=HEADER_DECODE_CACHE_SIZE)
+def decode_encoded_header(header):
     decoded_parts = decode_header(header)
     decoded_string = ""
     for part, charset in decoded_parts:
@@ -145,26 +243,60 @@ def get_email_body_from_gmail_api_payload(payload):
         return base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8', errors='ignore')
     return ""
 
-def is_marketing_email(email_body, subject, sender_email):
-    """Performs a secondary check if an email is likely a marketing email."""
-    body_lower = email_body.lower()
-    subject_lower = subject.lower()
-    sender_email_lower = sender_email.lower()
+def env_list(name, default):
+    """Reads a comma-separated list from the environment, falling back to `default`."""
+    value = os.getenv(name)
+    if value is None:
+        return list(default)
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+# One rule set for header triage, the full-message filter, the Gmail query and key people
+MARKETING_KEYWORDS = env_list("MARKETING_KEYWORDS", DEFAULT_MARKETING_KEYWORDS)
+MARKETING_SENDER_PATTERNS = env_list("MARKETING_SENDER_PATTERNS", DEFAULT_MARKETING_SENDER_PATTERNS)
+MARKETING_MATCHER = MarketingMatcher(MARKETING_KEYWORDS, MARKETING_SENDER_PATTERNS)
+
+# Optional learned bulk-mail classifier (see train_bulk_classifier.py); used only when the model file exists
+BULK_CLASSIFIER_MODEL = os.getenv("BULK_CLASSIFIER_MODEL", "bulk_classifier.npz")
+BULK_CLASSIFIER_THRESHOLD = float(os.getenv("BULK_CLASSIFIER_THRESHOLD", 0.9))
+_bulk_classifier = None
+
+def get_bulk_classifier():
+    """Returns the trained bulk-mail classifier, or None when no model has been trained."""
+    global _bulk_classifier
+    if _bulk_classifier is None:
+        _bulk_classifier = BulkMailClassifier.load(BULK_CLASSIFIER_MODEL) or False
+    return _bulk_classifier or None
+
+def apply_bulk_classifier(records, heuristic_flags):
+    """
+    Combines keyword-rule verdicts with the classifier, scoring all records in one batch.
+    A score at or above BULK_CLASSIFIER_THRESHOLD drops a message, a score at or below
+    1 - BULK_CLASSIFIER_THRESHOLD keeps it even if a keyword rule fired, and anything in
+    between falls back to the rules. Returns the list of drop flags.
+    """
+    classifier = get_bulk_classifier()
+    if classifier is None or not records:
+        return list(heuristic_flags)
+    scores = classifier.score_batch(records)
+    return [
+        bool(score >= BULK_CLASSIFIER_THRESHOLD or (flag and score > 1 - BULK_CLASSIFIER_THRESHOLD))
+        for flag, score in zip(heuristic_flags, scores)
+    ]
 
-    if "unsubscribe" in body_lower:
-        return True
-    
-    marketing_keywords = ["promo", "newsletter", "discount", "offer", "sale", "webinar", "event", "free trial", "coupon", "exclusive"]
-    if any(keyword in subject_lower for keyword in marketing_keywords):
-        return True
-    if any(keyword in body_lower for keyword in marketing_keywords):
-        return True
-    
-    marketing_sender_patterns = ["noreply", "info@", "support@", "marketing@", "updates@", "notifications@"]
-    if any(pattern in sender_email_lower for pattern in marketing_sender_patterns):
-        return True
-    
-    return False
+# Persistent decayed bulk/kept history per sender and domain, consulted before body download
+SENDER_REPUTATION_ENABLED = os.getenv("SENDER_REPUTATION_ENABLED", "true").lower() == "true"
+_sender_reputation = None
+
+def get_sender_reputation():
+    """Returns the shared sender reputation store, or None when it is disabled."""
+    global _sender_reputation
+    if _sender_reputation is None and SENDER_REPUTATION_ENABLED:
+        _sender_reputation = SenderReputation()
+    return _sender_reputation
+
+def is_marketing_metadata(subject, sender_email, has_list_unsubscribe=False):
+    """Checks headers only (subject, sender, List-Unsubscribe) for marketing signals."""
+    return bool(MARKETING_MATCHER.fired_rules(subject, sender_email, has_list_unsubscribe=has_list_unsubscribe))
 
 def extract_entities(text):
     """Extracts named entities (people, organizations) using spaCy."""
@@ -174,12 +306,10 @@ def extract_entities(text):
     orgs = [ent.text for ent in doc.ents if ent.label_ == "ORG"]
     return people, orgs
 
-def extract_keywords_for_themes(text, num_keywords=10):
-    """Extracts common keywords (potential themes) from text."""
+def tokenize_for_themes(text):
+    """Lowercases and tokenizes text, keeping alphabetic non-stopword tokens."""
     words = nltk.word_tokenize(text.lower())
-    filtered_words = [word for word in words if word.isalpha() and word not in stop_words]
-    word_counts = Counter(filtered_words)
-    return [word for word, count in word_counts.most_common(num_keywords)]
+    return [word for word in words if word.isalpha() and word not in stop_words]
 
 # Gmail Authentication
 def authenticate_gmail():
@@ -197,26 +327,282 @@ def authenticate_gmail():
             token.write(creds.to_json())
     return creds
 
+# Concurrent Fetch Engine
+class AsyncTokenBucket:
+    """Async token bucket shared by all workers; tokens are Gmail quota units."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, units=1):
+        """Waits until `units` tokens are available and consumes them."""
+        units = min(units, self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= units:
+                    self.tokens -= units
+                    return
+                await asyncio.sleep((units - self.tokens) / self.rate)
+
+_gmail_rate_limiter = None
+_calendar_rate_limiter = None
+
+def get_gmail_rate_limiter():
+    """Returns the process-wide Gmail quota limiter, created on first use inside the event loop."""
+    global _gmail_rate_limiter
+    if _gmail_rate_limiter is None:
+        _gmail_rate_limiter = AsyncTokenBucket(GMAIL_QUOTA_UNITS_PER_SECOND)
+    return _gmail_rate_limiter
+
+def get_thread_http(service):
+    """Returns the calling thread's shared transport for the service's credentials."""
+    return google_services.http_for(service._http.credentials)
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter, capped at 32 seconds."""
+    return random.uniform(0, min(32, 2 ** attempt))
+
+def get_calendar_rate_limiter():
+    """Returns the process-wide Calendar request limiter (one token per request)."""
+    global _calendar_rate_limiter
+    if _calendar_rate_limiter is None:
+        _calendar_rate_limiter = AsyncTokenBucket(CALENDAR_REQUESTS_PER_SECOND)
+    return _calendar_rate_limiter
+
+async def execute_request(service, request, quota_units=5, limiter=None):
+    """
+    Executes a googleapiclient request off the event loop after acquiring quota.
+    Uses the Gmail limiter unless another limiter is given.
+    Retries with backoff on 429/5xx responses and re-raises any other HttpError.
+    """
+    limiter = limiter or get_gmail_rate_limiter()
+    for attempt in range(MAX_REQUEST_RETRIES + 1):
+        await limiter.acquire(quota_units)
+        try:
+            return await asyncio.to_thread(lambda: request.execute(http=get_thread_http(service)))
+        except HttpError as e:
+            if e.resp.status not in RETRYABLE_HTTP_STATUSES or attempt == MAX_REQUEST_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+            logging.warning(f"Google API returned {e.resp.status}, retrying in {delay:.1f}s.")
+            await asyncio.sleep(delay)
+
+# Google Service Factory
+GOOGLE_HTTP_TIMEOUT_SECONDS = 60
+
+class GoogleServiceFactory:
+    """
+    Builds Gmail and Calendar clients that share one keep-alive transport per credential.
+    Discovery documents come from the static copies bundled with google-api-python-client,
+    so building a client makes no network call, and built clients are reused for the same
+    credential. httplib2.Http is not thread-safe, so each worker thread gets its own
+    transport per credential; threads never share a connection.
+    """
+
+    def __init__(self, timeout=GOOGLE_HTTP_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self._services = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def http_for(self, credentials):
+        """Returns the calling thread's authorized transport for credentials."""
+        transports = getattr(self._local, 'transports', None)
+        if transports is None:
+            transports = self._local.transports = {}
+        entry = transports.get(id(credentials))
+        if entry is None or entry[0] is not credentials:
+            entry = transports[id(credentials)] = (
+                credentials,
+                google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=self.timeout))
+            )
+        return entry[1]
+
+    def build(self, service_name, version, credentials):
+        """Returns a client for service_name/version, building it once per credential."""
+        key = (service_name, version, id(credentials))
+        with self._lock:
+            entry = self._services.get(key)
+            if entry is None or entry[0] is not credentials:
+                service = build(
+                    service_name, version,
+                    http=self.http_for(credentials),
+                    static_discovery=True,
+                    cache_discovery=False
+                )
+                entry = self._services[key] = (credentials, service)
+            return entry[1]
+
+google_services = GoogleServiceFactory()
+
 # Fetch & Parse Emails
-async def fetch_recent_messages(service, days=14, max_results=50):
-    """Fetches recent email messages with filtering."""
-    date_after = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days))
-    query = f"after:{int(date_after.timestamp())} is:inbox -category:promotions -category:social -category:updates -category:forums -\"unsubscribe\" -\"promo\" -\"newsletter\" -\"discount\" -\"offer\" -\"sale\" -\"webinar\" -\"event\" -\"free trial\" -\"coupon\" -\"exclusive\" -from:noreply@* -from:info@* -from:marketing@* -from:updates@* -from:notifications@*"
-    
-    messages = []
-    next_page_token = None
-    while True:
-        results = service.users().messages().list(userId='me', q=query, maxResults=max_results, pageToken=next_page_token).execute()
-        messages.extend(results.get('messages', []))
+def build_inbox_query(days=14, after=None, before=None):
+    """
+    Builds the Gmail search query for recent, non-marketing inbox mail.
+    `after`/`before` are epoch seconds; `after` defaults to `days` ago.
+    """
+    if after is None:
+        after = int((datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)).timestamp())
+    date_range = f"after:{int(after)}" + (f" before:{int(before)}" if before is not None else "")
+    return f"{date_range} is:inbox -category:promotions -category:social -category:updates -category:forums {MARKETING_MATCHER.gmail_query_exclusions()}"
+
+async def list_ids_sharded(service, resource='messages', days=14, max_results=LIST_PAGE_SIZE,
+                           min_shard_seconds=MIN_LIST_SHARD_SECONDS, concurrency=GMAIL_CONCURRENCY):
+    """
+    Lists message or thread stubs for the window by paging date shards concurrently.
+    The window starts as one after:/before: shard. When a shard's first page is full,
+    it is split in half and both halves are listed concurrently. Dense periods get narrow
+    shards and quiet mailboxes cost a single request. Ids are deduplicated and results
+    are merged newest first, matching the order of an unsharded listing.
+    """
+    list_method = service.users().messages().list if resource == 'messages' else service.users().threads().list
+    quota_units = GMAIL_QUOTA_UNITS[f'{resource}.list']
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    end = int(datetime.datetime.now(datetime.timezone.utc).timestamp()) + 1
+    start = end - days * 86400
+    shard_count = 0
+
+    async def list_page(query, page_token=None):
+        async with semaphore:
+            return await execute_request(
+                service,
+                list_method(userId='me', q=query, maxResults=max_results, pageToken=page_token),
+                quota_units
+            )
+
+    async def list_shard(after, before):
+        nonlocal shard_count
+        shard_count += 1
+        query = build_inbox_query(after=after, before=before)
+        results = await list_page(query)
+        items = results.get(resource, [])
         next_page_token = results.get('nextPageToken')
-        if not next_page_token:
-            break
-    return messages
+        if next_page_token and before - after > min_shard_seconds:
+            middle = (after + before) // 2
+            # Shards overlap by one second so a message stamped exactly at the boundary is never dropped
+            newer, older = await asyncio.gather(list_shard(middle, before), list_shard(after, middle + 1))
+            return newer + older
+        while next_page_token:
+            results = await list_page(query, next_page_token)
+            items.extend(results.get(resource, []))
+            next_page_token = results.get('nextPageToken')
+        return items
+
+    merged = []
+    seen_ids = set()
+    for item in await list_shard(start, end):
+        if item['id'] not in seen_ids:
+            seen_ids.add(item['id'])
+            merged.append(item)
+    logging.info(f"Sharded listing: {len(merged)} {resource} across {shard_count} date shards.")
+    return merged
+
+_signature_templates = None
+
+def get_signature_templates():
+    """Returns the shared per-sender signature templates, or None when stripping is disabled."""
+    global _signature_templates
+    if _signature_templates is None and SIGNATURE_STRIPPING_ENABLED:
+        _signature_templates = SignatureTemplates()
+    return _signature_templates
+
+def clean_body_fields(body):
+    """
+    Splits quoted reply/forward history off a plain-text body.
+    The message's own text is kept uncleaned as 'novel_text' for finish_email_body and
+    strip_email_signature; reply history is reduced to its size and the address it is
+    attributed to, and link_quoted_messages later points 'quoted_message_id' at the
+    message it came from. Forwarded text is kept cleaned in 'forwarded_body'.
+    """
+    novel_body, quoted_body, quoted_from, is_forward = split_reply(body)
+    quoted_body = clean_text(quoted_body)
+    return {
+        'novel_text': novel_body,
+        'forwarded_body': quoted_body if is_forward else '',
+        'quoted_chars': 0 if is_forward else len(quoted_body),
+        'quoted_from': quoted_from,
+        'quoted_message_id': None
+    }
 
-async def get_message_details(service, msg_id):
-    """Gets full message details including headers and body."""
-    msg = service.users().messages().get(userId='me', id=msg_id, format='full').execute()
-    
+def finish_email_body(email_data):
+    """
+    Builds a parsed (or cached) record's 'body' from its 'novel_text': the text is cleaned
+    and any forwarded text appended (its length in 'forwarded_chars') until
+    link_quoted_messages finds the forwarded message in the same thread. 'novel_text' is
+    kept for strip_email_signature, which runs after the marketing filter.
+    """
+    if 'body' in email_data:
+        return email_data
+    body = clean_text(email_data.get('novel_text', ''))
+    forwarded_body = email_data.pop('forwarded_body', '')
+    if forwarded_body:
+        body = f"{body} {forwarded_body}".strip()
+    email_data['body'] = body
+    email_data['forwarded_chars'] = len(forwarded_body)
+    return email_data
+
+def strip_email_signature(email_data):
+    """
+    Removes the sender's learned signature from a record's 'body', using the line
+    structure kept in 'novel_text'. Runs on every kept message rather than at parse
+    time, so cached messages benefit from templates learned later; it comes after the
+    marketing filter so a bulk sender's repeated footer is still seen by the body rules.
+    """
+    novel_body = email_data.pop('novel_text', None)
+    signature_templates = get_signature_templates()
+    if novel_body is None or not signature_templates:
+        return email_data
+    stripped_body = signature_templates.strip(email_data.get('from_email', ''), novel_body, email_data.get('id'))
+    if stripped_body is not novel_body:
+        forwarded_chars = email_data.get('forwarded_chars', 0)
+        forwarded_body = email_data['body'][-forwarded_chars:] if forwarded_chars else ''
+        email_data['body'] = f"{clean_text(stripped_body)} {forwarded_body}".strip()
+    return email_data
+
+_ADDRESS_SPECIALS_PATTERN = re.compile(r'[][\\()<>@,:;".]')
+
+def format_address(name, address):
+    """
+    Formats a decoded display name and address as "Name <addr>", quoting the name when it
+    contains specials (like the comma in "Doe, Jane") so the string parses back whole.
+    Unlike email.utils.formataddr, non-ASCII names are kept as text rather than re-encoded.
+    """
+    if not name:
+        return address
+    if _ADDRESS_SPECIALS_PATTERN.search(name):
+        name = '"{}"'.format(name.replace('\\', '\\\\').replace('"', '\\"'))
+    return f"{name} <{address}>"
+
+def split_address_header(value):
+    """
+    Splits a To/Cc header into "Name <addr>" (or bare "addr") strings with getaddresses,
+    so quoted display names containing commas stay whole.
+    """
+    return [
+        format_address(decode_email_header(name), address)
+        for name, address in getaddresses([value]) if address
+    ]
+
+def bulk_header_flags(headers):
+    """
+    Mailing-list and bulk-precedence flags from a dict of lower-cased header names to
+    values; the same fields on triage and parsed records feed the bulk-mail classifier.
+    """
+    return {
+        'has_list_unsubscribe': "list-unsubscribe" in headers,
+        'has_list_id': "list-id" in headers,
+        'is_bulk_precedence': headers.get("precedence", "").strip().lower() in ("bulk", "list", "junk")
+    }
+
+def parse_gmail_message(msg):
+    """Builds the email dict from a full-format Gmail API message resource."""
     headers = msg["payload"]["headers"]
     subject = ""
     sender_email = ""
@@ -224,6 +610,7 @@ async def get_message_details(service, msg_id):
     to_recipients = []
     cc_recipients = []
     date_sent = ""
+    bulk_headers = {}
     
     for header in headers:
         if header["name"] == "Subject":
@@ -238,17 +625,19 @@ async def get_message_details(service, msg_id):
                 sender_email = decode_email_header(sender_raw)
                 sender_name = sender_email
         elif header["name"] == "To":
-            to_recipients = [decode_email_header(r.strip()) for r in header["value"].split(',')]
+            to_recipients = split_address_header(header["value"])
         elif header["name"] == "Cc":
-            cc_recipients = [decode_email_header(r.strip()) for r in header["value"].split(',')]
+            cc_recipients = split_address_header(header["value"])
         elif header["name"] == "Date":
             date_sent = decode_email_header(header["value"])
+        elif header["name"].lower() in ("list-unsubscribe", "list-id", "precedence"):
+            bulk_headers[header["name"].lower()] = header["value"]
 
     body = get_email_body_from_gmail_api_payload(msg["payload"])
-    cleaned_body = clean_text(body)
+    attachments = get_attachment_metadata_from_gmail_api_payload(msg["payload"])
     
     return {
-        'id': msg_id,
+        'id': msg['id'],
         'threadId': msg['threadId'],
         'subject': subject,
         'from_name': sender_name,
@@ -256,148 +645,962 @@ async def get_message_details(service, msg_id):
         'to_recipients': to_recipients,
         'cc_recipients': cc_recipients,
         'date': date_sent,
-        'body': cleaned_body,
-        'has_attachments': 'attachmentId' in str(msg["payload"])
+        'timestamp': parse_email_timestamp(date_sent),
+        **bulk_header_flags(bulk_headers),
+        **clean_body_fields(body),
+        'has_attachments': bool(attachments),
+        'attachments': attachments
+    }
+
+def get_attachment_metadata_from_gmail_api_payload(payload):
+    """Collects filename, MIME type and size of every attachment part in a Gmail API payload."""
+    attachments = []
+    pending_parts = [payload]
+    while pending_parts:
+        part = pending_parts.pop()
+        body = part.get('body', {})
+        if 'attachmentId' in body:
+            attachments.append({
+                'filename': part.get('filename', ''),
+                'mime_type': part.get('mimeType', ''),
+                'size': body.get('size', 0)
+            })
+        pending_parts.extend(reversed(part.get('parts', [])))
+    return attachments
+
+def html_to_text(html_content):
+    """Strips tags, scripts and styles from an HTML body and unescapes entities."""
+    html_content = re.sub(r'(?is)<(script|style)\b.*?</\1>', ' ', html_content)
+    html_content = re.sub(r'<[^>]+>', ' ', html_content)
+    return html.unescape(html_content)
+
+def decode_mime_part_text(part):
+    """Returns a text part's content, tolerating unknown or wrong charsets."""
+    try:
+        return part.get_content()
+    except (LookupError, UnicodeDecodeError, AssertionError):
+        payload = part.get_payload(decode=True) or b''
+        return payload.decode('utf-8', errors='ignore')
+
+def parse_raw_gmail_message(msg):
+    """
+    Builds the email dict from a raw-format Gmail API message.
+    The RFC 822 bytes are parsed once; a single walk over the MIME tree picks the first
+    text/plain part (falling back to text/html) and records attachment metadata.
+    """
+    message = BytesParser(policy=policy.default).parsebytes(base64.urlsafe_b64decode(msg['raw']))
+
+    plain_body = None
+    html_body = None
+    attachments = []
+    for part in message.walk():
+        if part.is_multipart():
+            continue
+        filename = part.get_filename()
+        if part.get_content_disposition() == 'attachment' or filename:
+            attachments.append({
+                'filename': filename or '',
+                'mime_type': part.get_content_type(),
+                'size': len(part.get_payload(decode=True) or b'')
+            })
+        elif part.get_content_type() == 'text/plain' and plain_body is None:
+            plain_body = decode_mime_part_text(part)
+        elif part.get_content_type() == 'text/html' and html_body is None:
+            html_body = decode_mime_part_text(part)
+
+    if plain_body is None:
+        plain_body = html_to_text(html_body) if html_body else ""
+
+    sender_name = ""
+    sender_email = ""
+    from_header = message['From']
+    if from_header is not None and from_header.addresses:
+        sender_email = from_header.addresses[0].addr_spec
+        sender_name = from_header.addresses[0].display_name or sender_email
+    elif from_header is not None:
+        sender_email = sender_name = str(from_header)
+
+    def recipients(header_name):
+        header = message[header_name]
+        if header is None:
+            return []
+        return [str(address) for address in header.addresses]
+
+    return {
+        'id': msg['id'],
+        'threadId': msg['threadId'],
+        'subject': str(message['Subject'] or ''),
+        'from_name': sender_name,
+        'from_email': sender_email,
+        'to_recipients': recipients('To'),
+        'cc_recipients': recipients('Cc'),
+        'date': str(message['Date'] or ''),
+        'timestamp': parse_email_timestamp(str(message['Date'] or '')),
+        **bulk_header_flags({
+            name.lower(): str(message[name])
+            for name in ("List-Unsubscribe", "List-Id", "Precedence") if message[name] is not None
+        }),
+        **clean_body_fields(plain_body),
+        'has_attachments': bool(attachments),
+        'attachments': attachments
+    }
+
+def build_message_get_request(service, msg_id):
+    """Builds the messages.get request for the configured GMAIL_MESSAGE_FORMAT."""
+    if GMAIL_MESSAGE_FORMAT == 'raw':
+        return service.users().messages().get(userId='me', id=msg_id, format='raw', fields=RAW_MESSAGE_FIELDS)
+    return service.users().messages().get(userId='me', id=msg_id, format='full', fields=FULL_MESSAGE_FIELDS)
+
+def parse_message_response(msg):
+    """Parses a messages.get response in whichever format it was requested."""
+    if 'raw' in msg:
+        return parse_raw_gmail_message(msg)
+    return parse_gmail_message(msg)
+
+_message_cache = None
+
+def get_message_cache():
+    """Returns the shared parsed-message cache, or None when caching is disabled."""
+    global _message_cache
+    if _message_cache is None and MESSAGE_CACHE_ENABLED:
+        _message_cache = MessageCache("analyze_consolidated", PARSED_EMAIL_SCHEMA_VERSION)
+    return _message_cache
+
+async def run_gmail_batches(service, msg_ids, build_request, parse_response, batch_size=GMAIL_BATCH_SIZE,
+                            quota_units=GMAIL_QUOTA_UNITS['messages.get'], concurrency=GMAIL_CONCURRENCY):
+    """
+    Executes one request per message id through Gmail batch requests.
+    Each batch carries up to batch_size calls (fewer when that would cost more quota than
+    the limiter's capacity) in a single HTTP round trip, and up to
+    `concurrency` batches are in flight at once under the shared quota limiter.
+    Items rejected with 429/5xx are re-queued with backoff; any other per-item failure
+    is logged and skipped without failing the rest of its batch.
+    Returns a dict of message id to parsed response.
+    """
+    results = {}
+    limiter = get_gmail_rate_limiter()
+    # A batch is charged in full before it is sent, so it may not cost more than the bucket holds
+    batch_size = max(1, min(batch_size, int(limiter.capacity // quota_units)))
+    queue = asyncio.Queue()
+    for start in range(0, len(msg_ids), batch_size):
+        queue.put_nowait((list(msg_ids[start:start + batch_size]), 0))
+
+    def execute_batch(chunk):
+        retryable = []
+
+        def handle_response(request_id, response, exception):
+            if exception is not None:
+                if isinstance(exception, HttpError) and exception.resp.status in RETRYABLE_HTTP_STATUSES:
+                    retryable.append(request_id)
+                else:
+                    logging.error(f"Error fetching email {request_id}: {exception}")
+                return
+            try:
+                results[request_id] = parse_response(response)
+            except Exception as e:
+                logging.error(f"Error processing email {request_id}: {e}")
+
+        batch = service.new_batch_http_request(callback=handle_response)
+        for msg_id in chunk:
+            batch.add(build_request(msg_id), request_id=msg_id)
+        try:
+            batch.execute(http=get_thread_http(service))
+        except HttpError as e:
+            if e.resp.status in RETRYABLE_HTTP_STATUSES:
+                return chunk
+            logging.error(f"Error executing Gmail batch of {len(chunk)} messages: {e}")
+        return retryable
+
+    async def worker():
+        while True:
+            chunk, attempt = await queue.get()
+            try:
+                await limiter.acquire(len(chunk) * quota_units)
+                retryable = await asyncio.to_thread(execute_batch, chunk)
+                if retryable:
+                    if attempt < MAX_REQUEST_RETRIES:
+                        delay = backoff_delay(attempt)
+                        logging.warning(f"{len(retryable)} messages rate limited, retrying in {delay:.1f}s.")
+                        await asyncio.sleep(delay)
+                        queue.put_nowait((retryable, attempt + 1))
+                    else:
+                        logging.error(f"Giving up on {len(retryable)} messages after {MAX_REQUEST_RETRIES} retries.")
+            except Exception as e:
+                logging.error(f"Unexpected error in Gmail batch worker: {e}")
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    await queue.join()
+    for task in workers:
+        task.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    return results
+
+async def get_message_details_batch(service, msg_ids, batch_size=GMAIL_BATCH_SIZE):
+    """
+    Gets full message details for many messages, returned in the same order as msg_ids.
+    Messages already in the on-disk message cache are served without a Gmail call;
+    every record goes through finish_email_body on the way out.
+    """
+    cache = get_message_cache()
+    results = cache.get_many(msg_ids) if cache else {}
+    missing_ids = [msg_id for msg_id in msg_ids if msg_id not in results]
+    if missing_ids:
+        fetched = await run_gmail_batches(
+            service, missing_ids,
+            lambda msg_id: build_message_get_request(service, msg_id),
+            parse_message_response,
+            batch_size
+        )
+        if cache:
+            cache.put_many(fetched.values())
+        results.update(fetched)
+    if cache:
+        logging.info(f"Message cache: {len(msg_ids) - len(missing_ids)} hits, {len(missing_ids)} misses.")
+    return [finish_email_body(results[msg_id]) for msg_id in msg_ids if msg_id in results]
+
+def parse_gmail_thread(thread):
+    """Parses every message of a full-format thread resource, ordered oldest first."""
+    messages = sorted(thread.get('messages', []), key=lambda m: int(m.get('internalDate', 0)))
+    return [parse_gmail_message(msg) for msg in messages]
+
+async def get_thread_details_batch(service, thread_ids, batch_size=GMAIL_BATCH_SIZE, window_start=None):
+    """
+    Gets whole conversations with one threads.get call each, batched like get_message_details_batch.
+    Returns a dict of threadId to its email dicts in time order, ready for analyze_email_interactions.
+    threads.get returns every message of a conversation, so with a window_start (an aware
+    datetime) only messages dated inside the window are returned, as in message mode.
+    Threads are not triaged on metadata; run_email_pipeline's filter stage drops marketing mail.
+    """
+    threads = await run_gmail_batches(
+        service, thread_ids,
+        lambda thread_id: service.users().threads().get(userId='me', id=thread_id, format='full', fields=FULL_THREAD_FIELDS),
+        parse_gmail_thread,
+        batch_size,
+        quota_units=GMAIL_QUOTA_UNITS['threads.get']
+    )
+    cache = get_message_cache()
+    if cache:
+        cache.put_many(email_data for thread_emails in threads.values() for email_data in thread_emails)
+    if window_start is not None:
+        window_epoch = window_start.timestamp()
+        threads = {
+            thread_id: [email_data for email_data in thread_emails if (email_data['timestamp'] or 0) >= window_epoch]
+            for thread_id, thread_emails in threads.items()
+        }
+        threads = {thread_id: thread_emails for thread_id, thread_emails in threads.items() if thread_emails}
+    for thread_emails in threads.values():
+        for email_data in thread_emails:
+            finish_email_body(email_data)
+    return threads
+
+def parse_triage_metadata(msg):
+    """Extracts the headers needed for marketing triage from a metadata-format message."""
+    headers = {header["name"].lower(): header["value"] for header in msg.get("payload", {}).get("headers", [])}
+    sender_raw = headers.get("from", "")
+    sender_name_match = re.match(r'^(.*?)\s*<([^>]+)>', sender_raw)
+    sender_email = sender_name_match.group(2) if sender_name_match else sender_raw
+    return {
+        'id': msg['id'],
+        'subject': decode_email_header(headers.get("subject", "")),
+        'from_name': decode_email_header(sender_name_match.group(1).strip().strip('"')) if sender_name_match else '',
+        'from_email': sender_email,
+        'to_recipients': split_address_header(headers.get("to", "")),
+        'cc_recipients': split_address_header(headers.get("cc", "")),
+        'date': headers.get("date", ""),
+        **bulk_header_flags(headers)
+    }
+
+async def triage_messages(service, msg_ids, batch_size=GMAIL_BATCH_SIZE):
+    """
+    Fetches metadata-only headers for msg_ids and drops likely marketing mail.
+    Senders the reputation store knows to be bulk are dropped without evaluating rules;
+    the other verdicts are recorded in it.
+    Returns (surviving_ids, filtered) where filtered maps message id to its Date header.
+    """
+    metadata = await run_gmail_batches(
+        service, msg_ids,
+        lambda msg_id: service.users().messages().get(
+            userId='me', id=msg_id, format='metadata',
+            metadataHeaders=TRIAGE_METADATA_HEADERS, fields=TRIAGE_MESSAGE_FIELDS
+        ),
+        parse_triage_metadata,
+        batch_size
+    )
+
+    # Keep messages whose metadata could not be fetched; the full fetch will report them
+    reputation = get_sender_reputation()
+    filtered = {}
+    triaged = []
+    for msg_id in msg_ids:
+        meta = metadata.get(msg_id)
+        if meta is None:
+            continue
+        if reputation and reputation.is_bulk(meta['from_email']):
+            filtered[msg_id] = meta['date']
+        else:
+            triaged.append(meta)
+    reputation_filtered = len(filtered)
+
+    drop_flags = apply_bulk_classifier(
+        triaged,
+        [is_marketing_metadata(meta['subject'], meta['from_email'], meta['has_list_unsubscribe']) for meta in triaged]
+    )
+    for meta, drop in zip(triaged, drop_flags):
+        if drop:
+            filtered[meta['id']] = meta['date']
+            if reputation:
+                reputation.record(meta['from_email'], True, message_id=meta['id'])
+    surviving_ids = [msg_id for msg_id in msg_ids if msg_id not in filtered]
+    logging.info(
+        f"Metadata triage: {len(filtered)} of {len(msg_ids)} messages filtered before body download "
+        f"({reputation_filtered} by sender reputation)."
+    )
+    return surviving_ids, filtered
+
+async def stream_message_details(service, msg_ids, chunk_size=GMAIL_BATCH_SIZE * GMAIL_CONCURRENCY):
+    """
+    Yields parsed email dicts chunk by chunk instead of after the whole mailbox is fetched.
+    The next chunk is already downloading while the consumer works on the current one.
+    """
+    chunks = [msg_ids[start:start + chunk_size] for start in range(0, len(msg_ids), chunk_size)]
+    if not chunks:
+        return
+    next_fetch = asyncio.create_task(get_message_details_batch(service, chunks[0]))
+    for index in range(len(chunks)):
+        emails = await next_fetch
+        if index + 1 < len(chunks):
+            next_fetch = asyncio.create_task(get_message_details_batch(service, chunks[index + 1]))
+        for email_data in emails:
+            yield email_data
+
+async def stream_triaged_message_details(service, msg_ids, filtered=None):
+    """
+    Two-phase fetch: metadata triage for every message, then streamed full payloads for the
+    survivors. Triage-filtered ids are added to `filtered` as described in triage_messages.
+    """
+    surviving_ids, newly_filtered = await triage_messages(service, msg_ids)
+    if filtered is not None:
+        filtered.update(newly_filtered)
+    async for email_data in stream_message_details(service, surviving_ids):
+        yield email_data
+
+# Incremental Gmail Sync
+def load_gmail_sync_state(path=GMAIL_SYNC_STATE_FILE):
+    """
+    Loads the saved historyId, the Date header of every kept and triage-filtered message,
+    and ids whose download failed last run, or an empty state.
+    """
+    if not os.path.exists(path):
+        return {'historyId': None, 'messages': {}, 'filtered': {}, 'pending': []}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        state.setdefault('historyId', None)
+        state.setdefault('messages', {})
+        state.setdefault('filtered', {})
+        state.setdefault('pending', [])
+        # Older state files stored whole parsed records; only their dates are kept now
+        state['messages'] = {
+            msg_id: data['date'] if isinstance(data, dict) else data
+            for msg_id, data in state['messages'].items()
+        }
+        return state
+    except Exception as e:
+        logging.warning(f"Could not read Gmail sync state {path}, starting fresh: {e}")
+        return {'historyId': None, 'messages': {}, 'filtered': {}, 'pending': []}
+
+def save_gmail_sync_state(state, path=GMAIL_SYNC_STATE_FILE):
+    """Writes the sync state atomically so an interrupted run never leaves a corrupt store."""
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logging.error(f"Error saving Gmail sync state to {path}: {e}")
+
+async def list_history_changes(service, start_history_id):
+    """
+    Lists inbox message adds and deletes since start_history_id.
+    Returns (added_ids, deleted_ids, latest_history_id).
+    Raises HttpError with status 404 when start_history_id has expired.
+    """
+    added_ids = set()
+    deleted_ids = set()
+    latest_history_id = start_history_id
+    next_page_token = None
+    while True:
+        results = await execute_request(
+            service,
+            service.users().history().list(
+                userId='me',
+                startHistoryId=start_history_id,
+                labelId='INBOX',
+                historyTypes=['messageAdded', 'messageDeleted'],
+                pageToken=next_page_token
+            ),
+            GMAIL_QUOTA_UNITS['history.list']
+        )
+        for record in results.get('history', []):
+            for added in record.get('messagesAdded', []):
+                message = added['message']
+                if EXCLUDED_GMAIL_CATEGORIES.intersection(message.get('labelIds', [])):
+                    continue
+                added_ids.add(message['id'])
+                deleted_ids.discard(message['id'])
+            for deleted in record.get('messagesDeleted', []):
+                deleted_ids.add(deleted['message']['id'])
+                added_ids.discard(deleted['message']['id'])
+        latest_history_id = results.get('historyId', latest_history_id)
+        next_page_token = results.get('nextPageToken')
+        if not next_page_token:
+            break
+    return added_ids, deleted_ids, latest_history_id
+
+def is_within_window(date_header, window_start):
+    """Checks whether a stored email's Date header falls inside the sync window."""
+    try:
+        email_date_obj = parsedate_to_datetime(date_header)
+    except (TypeError, ValueError):
+        return False
+    if email_date_obj.tzinfo is None:
+        email_date_obj = email_date_obj.replace(tzinfo=datetime.timezone.utc)
+    return email_date_obj >= window_start
+
+async def iter_synced_messages(service, days=14, state_file=GMAIL_SYNC_STATE_FILE):
+    """
+    Yields parsed email dicts for the last `days` days, downloading only what changed.
+    Uses users.history.list from the saved historyId and falls back to a full
+    list_ids_sharded listing when there is no state or the history has expired.
+    The state file only keeps ids and Date headers; the parsed records themselves come
+    from the versioned message cache, and any the cache no longer holds are re-downloaded.
+    History records are not filtered by the search query; run_email_pipeline's filter
+    stage drops the marketing mail among them.
+    """
+    state = load_gmail_sync_state(state_file)
+    stored_messages = state['messages']
+    filtered_messages = state['filtered']
+    window_start = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
+
+    # Capture the history position before listing so changes made during the run are not lost
+    profile = await execute_request(service, service.users().getProfile(userId='me'), GMAIL_QUOTA_UNITS['getProfile'])
+    profile_history_id = profile.get('historyId')
+
+    ids_to_fetch = []
+    if state['historyId'] and stored_messages:
+        try:
+            added_ids, deleted_ids, _ = await list_history_changes(service, state['historyId'])
+            for msg_id in deleted_ids:
+                stored_messages.pop(msg_id, None)
+                filtered_messages.pop(msg_id, None)
+            # Messages whose download failed last run are retried along with the new ones
+            added_ids.update(msg_id for msg_id in state['pending'] if msg_id not in deleted_ids)
+            ids_to_fetch = [msg_id for msg_id in added_ids if msg_id not in stored_messages and msg_id not in filtered_messages]
+            logging.info(
+                f"Incremental sync: {len(added_ids)} added (including {len(state['pending'])} retried), "
+                f"{len(deleted_ids)} deleted since history {state['historyId']}."
+            )
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            logging.info("Gmail history expired, falling back to a full listing.")
+            state['historyId'] = None
+
+    if not state['historyId'] or not stored_messages:
+        msgs = await list_ids_sharded(service, 'messages', days=days)
+        listed_ids = {m['id'] for m in msgs}
+        stored_messages = {msg_id: date for msg_id, date in stored_messages.items() if msg_id in listed_ids}
+        filtered_messages = {msg_id: date for msg_id, date in filtered_messages.items() if msg_id in listed_ids}
+        ids_to_fetch = [m['id'] for m in msgs if m['id'] not in stored_messages and m['id'] not in filtered_messages]
+        logging.info(f"Full sync: {len(msgs)} listed, {len(ids_to_fetch)} not yet seen.")
+
+    stored_messages = {msg_id: date for msg_id, date in stored_messages.items() if is_within_window(date, window_start)}
+    filtered_messages = {msg_id: date for msg_id, date in filtered_messages.items() if is_within_window(date, window_start)}
+
+    # Already-synced messages are yielded first so downstream stages start before any download
+    async for email_data in stream_message_details(service, list(stored_messages)):
+        yield email_data
+    async for email_data in stream_triaged_message_details(service, ids_to_fetch, filtered=filtered_messages):
+        stored_messages[email_data['id']] = email_data['date']
+        yield email_data
+
+    # historyId still advances, so anything that failed to download is kept for the next run
+    pending_ids = [msg_id for msg_id in ids_to_fetch if msg_id not in stored_messages and msg_id not in filtered_messages]
+    if pending_ids:
+        logging.warning(f"{len(pending_ids)} messages could not be downloaded; they will be retried on the next sync.")
+    filtered_messages = {msg_id: date for msg_id, date in filtered_messages.items() if is_within_window(date, window_start)}
+    save_gmail_sync_state(
+        {'historyId': profile_history_id, 'messages': stored_messages, 'filtered': filtered_messages, 'pending': pending_ids},
+        state_file
+    )
+
+# Streaming Email Pipeline
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 100))
+_PIPELINE_DONE = object()
+
+def analyze_email_text(email_data):
+    """Runs entity and keyword extraction for one email body."""
+    people, orgs = extract_entities(email_data['body'])
+    return people, orgs, Counter(tokenize_for_themes(email_data['body']))
+
+async def iterate_emails(emails):
+    """Adapts an in-memory list of email dicts to a pipeline source."""
+    for email_data in emails:
+        yield email_data
+
+async def run_email_pipeline(email_source, queue_size=PIPELINE_QUEUE_SIZE, participant_index=None, contacts=None):
+    """
+    Streams emails through filter -> NLP -> aggregation stages joined by bounded queues.
+    email_source is an async iterator of parsed (decoded and cleaned) email dicts, so
+    fetching keeps running while earlier emails are being analysed, and a full queue
+    pauses the upstream stage instead of buffering the mailbox in memory.
+    Returns a dict with the kept emails, the aggregated people, organization and keyword
+    counts, and how often each marketing rule fired on filtered emails.
+    Kept emails have their signatures stripped after the marketing filter, and are also
+    added to participant_index and interned into contacts (a ContactTable) when given.
+    """
+    nlp_queue = asyncio.Queue(maxsize=queue_size)
+    aggregate_queue = asyncio.Queue(maxsize=queue_size)
+    aggregates = {
+        'emails': [],
+        'key_people': Counter(),
+        'key_organizations': Counter(),
+        'keyword_counts': Counter(),
+        'filtered_count': 0,
+        'marketing_rules': Counter()
     }
 
+    async def filter_stage():
+        try:
+            async for email_data in email_source:
+                # Body rules see the text before signature stripping, so bulk footers still count
+                fired_rules = MARKETING_MATCHER.fired_rules(email_data['subject'], email_data['from_email'], email_data['body'])
+                is_bulk = apply_bulk_classifier([email_data], [bool(fired_rules)])[0]
+                reputation = get_sender_reputation()
+                if reputation:
+                    reputation.record(email_data['from_email'], is_bulk, message_id=email_data['id'])
+                if is_bulk:
+                    email_data.pop('novel_text', None)
+                    aggregates['filtered_count'] += 1
+                    aggregates['marketing_rules'].update(fired_rules or ['classifier'])
+                    continue
+                await nlp_queue.put(strip_email_signature(email_data))
+        finally:
+            await nlp_queue.put(_PIPELINE_DONE)
+
+    async def nlp_stage():
+        try:
+            while (email_data := await nlp_queue.get()) is not _PIPELINE_DONE:
+                try:
+                    people, orgs, keyword_counts = await asyncio.to_thread(analyze_email_text, email_data)
+                except Exception as e:
+                    logging.error(f"Error analysing email {email_data['id']}: {e}")
+                    people, orgs, keyword_counts = [], [], Counter()
+                await aggregate_queue.put((email_data, people, orgs, keyword_counts))
+        finally:
+            await aggregate_queue.put(_PIPELINE_DONE)
+
+    async def aggregate_stage():
+        while (item := await aggregate_queue.get()) is not _PIPELINE_DONE:
+            email_data, people, orgs, keyword_counts = item
+            aggregates['emails'].append(email_data)
+            if contacts is not None:
+                contacts.intern_email(email_data)
+            if participant_index is not None:
+                participant_index.add(email_data)
+            if email_data['from_name'] and email_data['from_email'] and not MARKETING_MATCHER.is_marketing_sender(email_data['from_email']):
+                aggregates['key_people'][email_data['from_name']] += 1
+            aggregates['key_people'].update(people)
+            aggregates['key_organizations'].update(orgs)
+            aggregates['keyword_counts'].update(keyword_counts)
+
+    await asyncio.gather(filter_stage(), nlp_stage(), aggregate_stage())
+    return aggregates
+
 # Fetch and Process Calendar Events
-async def fetch_calendar_events(service, time_min, time_max):
+def parse_calendar_event(event):
+    """
+    Builds the event dict used throughout the brief from a Calendar API event resource.
+    Recurring masters keep their recurrence rules, and instances or exceptions keep their
+    series id and original start, so calendar_recurrence can expand them locally.
+    Cancelled exceptions carry no start or end.
+    """
+    organizer = event.get('organizer', {})
+    start = event.get('start', {})
+    end = event.get('end', {})
+    original_start = event.get('originalStartTime', {})
+    return {
+        'id': event.get('id'),
+        'ical_uid': event.get('iCalUID', event.get('id')),
+        'summary': event.get('summary', 'No Title'),
+        'description': event.get('description', ''),
+        'start_time': start.get('dateTime', start.get('date')),
+        'end_time': end.get('dateTime', end.get('date')),
+        'start_timezone': start.get('timeZone'),
+        'recurrence': event.get('recurrence', []),
+        'recurring_event_id': event.get('recurringEventId'),
+        'original_start_time': original_start.get('dateTime', original_start.get('date')),
+        'location': event.get('location', ''),
+        'organizer_email': organizer.get('email', ''),
+        'organizer_name': organizer.get('displayName', organizer.get('email', '')),
+        'attendees': [
+            {'email': att.get('email'), 'name': att.get('displayName', att.get('email')), 'responseStatus': att.get('responseStatus')}
+            for att in event.get('attendees', []) if att.get('email')
+        ],
+        'status': event.get('status'),
+        'transparency': event.get('transparency', 'opaque')
+    }
+
+def parse_event_time(value):
+    """Parses a Calendar dateTime or all-day date string into an aware UTC-comparable datetime."""
+    if 'T' in value:
+        parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    else:
+        parsed = datetime.datetime.strptime(value, '%Y-%m-%d')
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
+
+def format_calendar_time(value):
+    """Formats a datetime the way the Calendar API expects for timeMin/timeMax."""
+    return value.isoformat(timespec='seconds').replace('+00:00', 'Z')
+
+async def list_calendar_pages(service, calendar_id='primary', **list_params):
+    """
+    Follows nextPageToken through events.list and returns (raw_events, next_sync_token).
+    The sync token is only present on the last page, so every page is always read.
+    """
+    raw_events = []
+    page_token = None
+    while True:
+        results = await execute_request(
+            service,
+            service.events().list(calendarId=calendar_id, maxResults=CALENDAR_PAGE_SIZE, pageToken=page_token, **list_params),
+            quota_units=1,
+            limiter=get_calendar_rate_limiter()
+        )
+        raw_events.extend(results.get('items', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return raw_events, results.get('nextSyncToken')
+
+async def fetch_calendar_events(service, time_min, time_max, calendar_id='primary'):
     """Fetches calendar events within a specified time range."""
     processed_events = []
-    time_min_str = time_min.isoformat(timespec='seconds').replace('+00:00', 'Z')
-    time_max_str = time_max.isoformat(timespec='seconds').replace('+00:00', 'Z')
 
     try:
-        events_result = service.events().list(
-            calendarId='primary',
-            timeMin=time_min_str,
-            timeMax=time_max_str,
-            maxResults=100,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        
-        events = events_result.get('items', [])
-        for event in events:
-            event_data = {
-                'id': event.get('id'),
-                'summary': event.get('summary', 'No Title'),
-                'description': event.get('description', ''),
-                'start_time': event['start'].get('dateTime', event['start'].get('date')),
-                'end_time': event['end'].get('dateTime', event['end'].get('date')),
-                'location': event.get('location', ''),
-                'organizer_email': event['organizer'].get('email', ''),
-                'organizer_name': event['organizer'].get('displayName', event['organizer'].get('email', '')),
-                'attendees': [
-                    {'email': att.get('email'), 'name': att.get('displayName', att.get('email')), 'responseStatus': att.get('responseStatus')}
-                    for att in event.get('attendees', []) if att.get('email')
-                ],
-                'status': event.get('status')
-            }
-            processed_events.append(event_data)
+        if CALENDAR_EXPAND_RECURRING_LOCALLY:
+            events, _ = await list_calendar_pages(
+                service,
+                calendar_id,
+                timeMin=format_calendar_time(time_min),
+                timeMax=format_calendar_time(time_max),
+                singleEvents=False
+            )
+            processed_events = events_in_window([parse_calendar_event(event) for event in events], time_min, time_max)
+        else:
+            events, _ = await list_calendar_pages(
+                service,
+                calendar_id,
+                timeMin=format_calendar_time(time_min),
+                timeMax=format_calendar_time(time_max),
+                singleEvents=True,
+                orderBy='startTime'
+            )
+            for event in events:
+                processed_events.append(parse_calendar_event(event))
     except HttpError as e:
-        logging.error(f"Error fetching calendar events: {e}")
+        logging.error(f"Error fetching calendar events from {calendar_id}: {e}")
     
     return processed_events
 
+async def list_selected_calendars(service):
+    """Returns the ids of every calendar the user has selected in calendarList, primary first."""
+    calendar_ids = []
+    page_token = None
+    while True:
+        results = await execute_request(
+            service,
+            service.calendarList().list(pageToken=page_token, minAccessRole='reader'),
+            quota_units=1,
+            limiter=get_calendar_rate_limiter()
+        )
+        for entry in results.get('items', []):
+            if entry.get('primary'):
+                calendar_ids.insert(0, 'primary')
+            elif entry.get('selected'):
+                calendar_ids.append(entry['id'])
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+    return calendar_ids or ['primary']
+
+def merge_calendar_events(events_per_calendar):
+    """
+    Merges event lists from several calendars, collapsing copies of the same meeting.
+    Copies share an iCalUID (and start instant, for recurring instances; each calendar
+    writes dateTime in its own time zone, so starts are compared as parsed times); their attendee
+    lists are unioned and 'calendar_ids' records every calendar the meeting appeared on.
+    Returns the merged events ordered by start time.
+    """
+    merged = {}
+    for calendar_id, events in events_per_calendar.items():
+        for event_data in events:
+            key = (event_data.get('ical_uid') or event_data['id'], parse_event_time(event_data['start_time']).timestamp())
+            existing = merged.get(key)
+            if existing is None:
+                merged[key] = dict(event_data, calendar_ids=[calendar_id])
+                continue
+            existing['calendar_ids'].append(calendar_id)
+            known_attendees = {attendee['email'].lower() for attendee in existing['attendees']}
+            existing['attendees'] = existing['attendees'] + [
+                attendee for attendee in event_data['attendees'] if attendee['email'].lower() not in known_attendees
+            ]
+    return sorted(merged.values(), key=lambda event_data: parse_event_time(event_data['start_time']))
+
+async def fetch_all_calendar_events(service, time_min, time_max, calendar_ids=('primary',)):
+    """Fetches several calendars concurrently and merges their events."""
+    results = await asyncio.gather(*(fetch_calendar_events(service, time_min, time_max, calendar_id) for calendar_id in calendar_ids))
+    return merge_calendar_events(dict(zip(calendar_ids, results)))
+
+def new_calendar_state():
+    """Returns the empty sync state of a single calendar."""
+    return {'syncToken': None, 'timeMin': None, 'singleEvents': True, 'events': {}}
+
+def load_calendar_sync_state(path=CALENDAR_SYNC_STATE_FILE):
+    """Loads the per-calendar sync tokens and event stores, or an empty state."""
+    if not os.path.exists(path):
+        return {'calendars': {}}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if 'calendars' not in state:
+            # Single-calendar state written before multi-calendar support
+            state = {'calendars': {'primary': state}}
+        for calendar_id, calendar_state in state['calendars'].items():
+            if any('transparency' not in event for event in calendar_state.get('events', {}).values()):
+                # Stored before events carried their transparency; re-list the calendar
+                state['calendars'][calendar_id] = calendar_state = new_calendar_state()
+            for key, value in new_calendar_state().items():
+                calendar_state.setdefault(key, value)
+        return state
+    except Exception as e:
+        logging.warning(f"Could not read calendar sync state {path}, starting fresh: {e}")
+        return {'calendars': {}}
+
+def save_calendar_sync_state(state, path=CALENDAR_SYNC_STATE_FILE):
+    """Writes the calendar sync state atomically."""
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logging.error(f"Error saving calendar sync state to {path}: {e}")
+
+def events_in_window(stored_events, time_min, time_max):
+    """
+    Rebuilds the list fetch_calendar_events would return for a window from the local event store.
+    Recurring masters in the store are expanded into their instances first.
+    """
+    window_events = []
+    for event_data in expand_recurring_events(stored_events, time_min, time_max):
+        try:
+            if parse_event_time(event_data['start_time']) < time_max and parse_event_time(event_data['end_time']) > time_min:
+                window_events.append(event_data)
+        except (TypeError, ValueError) as e:
+            logging.warning(f"Skipping stored calendar event '{event_data.get('summary', 'N/A')}': {e}")
+    window_events.sort(key=lambda event_data: parse_event_time(event_data['start_time']))
+    return window_events
+
+async def sync_calendar_store(service, state, calendar_id='primary'):
+    """
+    Brings one calendar's event store up to date and returns the updated state.
+    With a syncToken only changed events are pulled; cancelled ones are removed.
+    Without a token, or when Google answers 410 Gone, the store is rebuilt from a full
+    listing starting CALENDAR_SYNC_LOOKBACK_DAYS ago. With CALENDAR_EXPAND_RECURRING_LOCALLY
+    the store holds recurring masters plus their exceptions, and cancelled instances are
+    kept as exceptions so local expansion can skip them.
+    """
+    single_events = not CALENDAR_EXPAND_RECURRING_LOCALLY
+    if state.get('singleEvents', True) != single_events:
+        # The stored events were listed in the other mode, so a token for them cannot be reused
+        state['syncToken'] = None
+
+    if state.get('syncToken'):
+        try:
+            changes, next_sync_token = await list_calendar_pages(service, calendar_id, syncToken=state['syncToken'], singleEvents=single_events)
+            for event in changes:
+                if event.get('status') == 'cancelled' and (single_events or not event.get('recurringEventId')):
+                    state['events'].pop(event['id'], None)
+                else:
+                    state['events'][event['id']] = parse_calendar_event(event)
+            state['syncToken'] = next_sync_token
+            logging.info(f"Calendar incremental sync ({calendar_id}): {len(changes)} changed events.")
+            return state
+        except HttpError as e:
+            if e.resp.status != 410:
+                raise
+            logging.info(f"Calendar sync token expired for {calendar_id}, running a full sync.")
+
+    time_min = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=CALENDAR_SYNC_LOOKBACK_DAYS)
+    events, next_sync_token = await list_calendar_pages(service, calendar_id, timeMin=format_calendar_time(time_min), singleEvents=single_events)
+    state['events'] = {
+        event['id']: parse_calendar_event(event)
+        for event in events
+        if event.get('status') != 'cancelled' or (not single_events and event.get('recurringEventId'))
+    }
+    state['syncToken'] = next_sync_token
+    state['timeMin'] = format_calendar_time(time_min)
+    state['singleEvents'] = single_events
+    logging.info(f"Calendar full sync ({calendar_id}): {len(state['events'])} events stored.")
+    return state
+
+async def sync_calendar_window(service, calendar_id, calendar_state, time_min, time_max):
+    """
+    Refreshes one calendar's store and returns its events for the window.
+    Falls back to a direct fetch_calendar_events listing if syncing fails or the window
+    starts before what the store covers.
+    """
+    if calendar_state.get('timeMin') and parse_event_time(calendar_state['timeMin']) > time_min:
+        logging.info(f"Requested window predates the event store of {calendar_id}, listing it directly.")
+        return await fetch_calendar_events(service, time_min, time_max, calendar_id)
+    try:
+        await sync_calendar_store(service, calendar_state, calendar_id)
+    except HttpError as e:
+        logging.error(f"Error syncing calendar {calendar_id}: {e}")
+        return await fetch_calendar_events(service, time_min, time_max, calendar_id)
+    return events_in_window(calendar_state['events'].values(), time_min, time_max)
+
+async def sync_calendar_events(service, time_min, time_max, calendar_ids=('primary',), state_file=CALENDAR_SYNC_STATE_FILE):
+    """
+    Returns merged events for the window across calendar_ids after refreshing every
+    calendar's local store concurrently. Each calendar keeps its own sync token.
+    """
+    state = load_calendar_sync_state(state_file)
+    calendar_states = {calendar_id: state['calendars'].get(calendar_id) or new_calendar_state() for calendar_id in calendar_ids}
+    results = await asyncio.gather(*(
+        sync_calendar_window(service, calendar_id, calendar_states[calendar_id], time_min, time_max)
+        for calendar_id in calendar_ids
+    ))
+    # Calendars no longer selected are dropped from the store
+    save_calendar_sync_state({'calendars': calendar_states}, state_file)
+    return merge_calendar_events(dict(zip(calendar_ids, results)))
+
 # Analysis Functions
-def analyze_email_interactions(emails_data, user_email):
-    """Analyzes email interactions and response patterns."""
+def link_quoted_messages(emails_data, threads=None):
+    """
+    Sets 'quoted_message_id' on every email whose quoted history was stripped, pointing at
+    the latest earlier message in its thread from the attributed sender; history whose
+    sender wrote nothing earlier in the thread stays unlinked. A forward whose source is
+    found this way has the forwarded text cut from its body, since the source already
+    carries it; other forwards keep it. `threads` may map threadId to time-ordered email
+    lists, as in analyze_email_interactions. Returns the number of emails linked.
+    """
+    if threads is None:
+        threads = defaultdict(list)
+        for email_entry in emails_data:
+            threads[email_entry['threadId']].append(email_entry)
+        for thread_emails in threads.values():
+            thread_emails.sort(key=lambda email_entry: email_epoch(email_entry) or 0)
+
+    linked = 0
+    for thread_emails in threads.values():
+        latest_by_sender = {}
+        for email_entry in thread_emails:
+            source = latest_by_sender.get(email_entry.get('quoted_from')) if email_entry.get('quoted_from') else None
+            forwarded_chars = email_entry.get('forwarded_chars', 0)
+            if source is not None and (forwarded_chars or email_entry.get('quoted_chars')):
+                if forwarded_chars:
+                    email_entry['body'] = email_entry['body'][:-forwarded_chars].rstrip()
+                    email_entry['quoted_chars'] = forwarded_chars
+                    email_entry['forwarded_chars'] = 0
+                email_entry['quoted_message_id'] = source['id']
+                linked += 1
+            latest_by_sender[email_entry['from_email'].lower()] = email_entry
+    return linked
+
+def analyze_email_interactions(emails_data, user_email, threads=None, contacts=None):
+    """
+    Analyzes email interactions and response patterns.
+    Emails are compared by their epoch 'timestamp' (set once at parse time), so each
+    thread is a single linear pass over its time-ordered emails. `threads` may map
+    threadId to time-ordered email lists (as produced by thread-mode ingestion);
+    regrouping and sorting are then skipped. `contacts` is the ContactTable the emails
+    were interned into at ingest; without it one is built here.
+    """
     email_exchange_counts = defaultdict(int)
     response_times_per_sender = defaultdict(list)
     emails_awaiting_response = []
+    now = time.time()
+    if contacts is None:
+        contacts = ContactTable()
+        for email_entry in emails_data:
+            contacts.intern_email(email_entry)
+    user_id = contacts.id_of(user_email)
     
-    threads = defaultdict(list)
-    for email_entry in emails_data:
-        threads[email_entry['threadId']].append(email_entry)
-
-    name_email_associations = defaultdict(Counter)
+    presorted = threads is not None
+    if not presorted:
+        threads = defaultdict(list)
+        for email_entry in emails_data:
+            threads[email_entry['threadId']].append(email_entry)
 
     for thread_id, email_list in threads.items():
-        sorted_emails = sorted(email_list, key=lambda x: parsedate_to_datetime(x['date']) if parsedate_to_datetime(x['date']) else datetime.datetime.min)
+        timed_emails = [(email_epoch(email_entry), email_entry) for email_entry in email_list]
+        timed_emails = [(timestamp, email_entry) for timestamp, email_entry in timed_emails if timestamp is not None]
+        if not presorted:
+            timed_emails.sort(key=lambda item: item[0])
 
         last_incoming_email_info = None
+        latest_email_info = None
+        latest_user_sent_timestamp = None
         
-        for email_entry in sorted_emails:
-            email_date_obj = parsedate_to_datetime(email_entry['date'])
-            if not email_date_obj:
-                continue
+        for timestamp, email_entry in timed_emails:
+            from_id = email_entry['from_id']
+            recipient_ids = email_entry['to_ids'] + email_entry['cc_ids']
 
-            normalized_from_email = email_entry['from_email'].lower()
-            normalized_to_recipients = [r.lower() for r in email_entry['to_recipients']]
-            normalized_cc_recipients = [r.lower() for r in email_entry['cc_recipients']]
-
-            # Populate name_email_associations
-            if email_entry['from_name'] and email_entry['from_email']:
-                name_email_associations[email_entry['from_name']][email_entry['from_email'].lower()] += 1
-            
-            for recipient_full in email_entry['to_recipients'] + email_entry['cc_recipients']:
-                match = re.match(r'^(.*?)\s*<([^>]+)>', recipient_full)
-                if match:
-                    name, email_addr = match.group(1).strip(), match.group(2)
-                    if name: 
-                        name_email_associations[name][email_addr.lower()] += 1
-
-            is_sent_by_user = (normalized_from_email == user_email.lower())
-            is_received_by_user = (user_email.lower() in normalized_to_recipients or user_email.lower() in normalized_cc_recipients)
+            is_sent_by_user = user_id is not None and from_id == user_id
+            is_received_by_user = user_id is not None and user_id in recipient_ids
 
             if is_sent_by_user:
-                for recipient in normalized_to_recipients + normalized_cc_recipients:
-                    if recipient != user_email.lower():
-                        email_exchange_counts[recipient] += 1
+                for recipient_id in recipient_ids:
+                    if recipient_id != user_id:
+                        email_exchange_counts[recipient_id] += 1
+                latest_user_sent_timestamp = max(timestamp, latest_user_sent_timestamp or timestamp)
             elif is_received_by_user:
-                email_exchange_counts[normalized_from_email] += 1
+                email_exchange_counts[from_id] += 1
                 
             if not is_sent_by_user and is_received_by_user:
-                last_incoming_email_info = (email_entry['from_email'], email_date_obj, email_entry['subject'])
+                last_incoming_email_info = (from_id, timestamp)
             elif is_sent_by_user and last_incoming_email_info:
-                original_sender_email, incoming_date_obj, _ = last_incoming_email_info
-                if email_date_obj > incoming_date_obj:
-                    response_time = email_date_obj - incoming_date_obj
-                    response_times_per_sender[original_sender_email].append(response_time)
+                original_sender_id, incoming_timestamp = last_incoming_email_info
+                if timestamp > incoming_timestamp:
+                    response_times_per_sender[original_sender_id].append(timestamp - incoming_timestamp)
                 last_incoming_email_info = None
+
+            latest_email_info = (timestamp, email_entry, is_sent_by_user, is_received_by_user)
         
-        # Check for emails awaiting response
-        sorted_emails_desc = sorted(email_list, key=lambda x: parsedate_to_datetime(x['date']) if parsedate_to_datetime(x['date']) else datetime.datetime.min, reverse=True)
-        
-        if sorted_emails_desc:
-            latest_email_in_thread = sorted_emails_desc[0]
-            latest_email_date_obj = parsedate_to_datetime(latest_email_in_thread['date'])
-
-            if latest_email_date_obj:
-                normalized_latest_from_email = latest_email_in_thread['from_email'].lower()
-                normalized_latest_to_recipients = [r.lower() for r in latest_email_in_thread['to_recipients']]
-                normalized_latest_cc_recipients = [r.lower() for r in latest_email_in_thread['cc_recipients']]
-
-                is_latest_sent_by_user = (normalized_latest_from_email == user_email.lower())
-                is_latest_received_by_user = (user_email.lower() in normalized_latest_to_recipients or user_email.lower() in normalized_latest_cc_recipients)
-
-                user_replied_after_this_incoming = False
-                for email_in_thread in sorted_emails:
-                    email_in_thread_date_obj = parsedate_to_datetime(email_in_thread['date'])
-                    if email_in_thread_date_obj and email_in_thread_date_obj > latest_email_date_obj:
-                        if email_in_thread['from_email'].lower() == user_email.lower():
-                            user_replied_after_this_incoming = True
-                            break
-                
-                if is_latest_received_by_user and not is_latest_sent_by_user and not user_replied_after_this_incoming:
-                    time_since_incoming = datetime.datetime.now(datetime.timezone.utc) - latest_email_date_obj
-                    if datetime.timedelta(hours=1) < time_since_incoming < datetime.timedelta(days=14):
-                        emails_awaiting_response.append({
-                            'subject': latest_email_in_thread['subject'],
-                            'sender': latest_email_in_thread['from_email'],
-                            'date': latest_email_date_obj.strftime('%Y-%m-%d %H:%M')
-                        })
-
-    final_name_to_email_map = {}
-    for name, email_counts in name_email_associations.items():
-        if email_counts:
-            final_name_to_email_map[name] = email_counts.most_common(1)[0][0]
+        # Check for emails awaiting response: the thread's latest email came in and the user has not replied since
+        if latest_email_info:
+            latest_timestamp, latest_email_in_thread, is_latest_sent_by_user, is_latest_received_by_user = latest_email_info
+            user_replied_after_this_incoming = latest_user_sent_timestamp is not None and latest_user_sent_timestamp > latest_timestamp
+            if is_latest_received_by_user and not is_latest_sent_by_user and not user_replied_after_this_incoming:
+                if 3600 < now - latest_timestamp < 14 * 86400:
+                    emails_awaiting_response.append({
+                        'subject': latest_email_in_thread['subject'],
+                        'sender': latest_email_in_thread['from_email'],
+                        'date': parsedate_to_datetime(latest_email_in_thread['date']).strftime('%Y-%m-%d %H:%M')
+                    })
+
+    final_name_to_email_map = contacts.name_to_address()
 
     avg_response_times = {}
-    for sender, times in response_times_per_sender.items():
+    for sender_id, times in response_times_per_sender.items():
+        sender = contacts.address(sender_id)
         if times:
-            total_seconds = sum(t.total_seconds() for t in times)
+            total_seconds = sum(times)
             avg_seconds = total_seconds / len(times)
             
             if avg_seconds < 60:
@@ -409,49 +1612,83 @@ def analyze_email_interactions(emails_data, user_email):
             else:
                 avg_response_times[sender] = f"{int(avg_seconds / 86400)} days"
     
-    top_email_exchange_contacts = Counter(email_exchange_counts).most_common(10)
+    top_email_exchange_contacts = [
+        (contacts.address(contact_id), count) for contact_id, count in Counter(email_exchange_counts).most_common(10)
+    ]
     
     return top_email_exchange_contacts, avg_response_times, final_name_to_email_map, emails_awaiting_response
 
-def get_upcoming_meetings(calendar_events, user_email):
-    """Filters for upcoming important meetings."""
+def get_upcoming_meetings(calendar_events, user_email, calendar_index=None, participant_index=None):
+    """
+    Filters for upcoming important meetings.
+    Uses calendar_index (built from calendar_events when not given) to pick the next
+    seven days by bisection; results come back already ordered by start time.
+    With a participant_index, each meeting gets the recent threads its attendees share
+    as 'prep_threads'.
+    """
     upcoming_meetings = []
-    now = datetime.datetime.now(datetime.timezone.utc)
-    look_ahead_end_time = now + datetime.timedelta(days=7)
+    if calendar_index is None:
+        calendar_index = CalendarIndex(calendar_events)
+    user_email_lower = user_email.lower()
     
-    for event in calendar_events:
+    for event in calendar_index.next_days(7):
         try:
-            event_start_str = event['start_time']
-            if 'T' in event_start_str:
-                event_start_dt = datetime.datetime.fromisoformat(event_start_str)
-            else:
-                event_start_dt = datetime.datetime.strptime(event_start_str, '%Y-%m-%d').replace(tzinfo=datetime.timezone.utc)
-            
-            if event_start_dt.tzinfo is None:
-                event_start_dt = event_start_dt.replace(tzinfo=datetime.timezone.utc)
-
-            if now < event_start_dt < look_ahead_end_time:
-                is_important = False
-                if event['organizer_email'].lower() == user_email.lower():
+            is_important = False
+            if event['organizer_email'].lower() == user_email_lower:
+                is_important = True
+            for attendee in event['attendees']:
+                if attendee['email'].lower() == user_email_lower and attendee.get('responseStatus') == 'accepted':
                     is_important = True
-                for attendee in event['attendees']:
-                    if attendee['email'].lower() == user_email.lower() and attendee.get('responseStatus') == 'accepted':
-                        is_important = True
-                        break
-                
-                if is_important:
-                    upcoming_meetings.append({
-                        'summary': event['summary'],
-                        'start_time': event_start_dt.strftime('%Y-%m-%d %H:%M'),
-                        'location': event['location'],
-                        'attendees': event['attendees']
-                    })
+                    break
+            
+            if is_important:
+                meeting = {
+                    'summary': event['summary'],
+                    'start_time': parse_event_time(event['start_time']).strftime('%Y-%m-%d %H:%M'),
+                    'location': event['location'],
+                    'attendees': event['attendees']
+                }
+                if participant_index is not None:
+                    attendee_emails = [attendee['email'] for attendee in event['attendees']] + [event['organizer_email']]
+                    meeting['prep_threads'] = participant_index.meeting_context(attendee_emails)
+                upcoming_meetings.append(meeting)
         except Exception as e:
             logging.warning(f"Could not process calendar event '{event.get('summary', 'N/A')}': {e}")
     
-    upcoming_meetings.sort(key=lambda x: datetime.datetime.strptime(x['start_time'], '%Y-%m-%d %H:%M'))
     return upcoming_meetings
 
+def attends_event(event, user_email):
+    """Checks whether the user organizes the event or is invited and has not declined it."""
+    user_email_lower = user_email.lower()
+    for attendee in event['attendees']:
+        if attendee['email'].lower() == user_email_lower:
+            return attendee.get('responseStatus') != 'declined'
+    return event['organizer_email'].lower() == user_email_lower
+
+def busy_events(calendar_events, user_email):
+    """
+    Returns the events that block the user's time: timed (not all-day), not marked as
+    free (transparent), and not declined by the user.
+    """
+    return [
+        event for event in calendar_events
+        if 'T' in (event.get('start_time') or '')
+        and event.get('transparency') != 'transparent'
+        and attends_event(event, user_email)
+    ]
+
+def get_upcoming_conflicts(calendar_index, days=7):
+    """
+    Lists pairs of overlapping events in the next `days` days.
+    calendar_index should be built from busy_events so all-day, free and declined
+    events do not count as conflicts.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return [
+        {'first': first['summary'], 'second': second['summary'], 'start_time': second['start_time']}
+        for first, second in calendar_index.conflicts(now, now + datetime.timedelta(days=days))
+    ]
+
 # Load Prompt from File
 def load_prompt_from_file(file_path):
     """Loads the prompt text from a specified file."""
@@ -568,6 +1805,25 @@ def generate_topic_chart(common_topics, output_path="topic_chart.png"):
     logging.info(f"Generated topic chart at {output_path}")
     return output_path
 
+def generate_meeting_load_chart(daily_meeting_hours, output_path="meeting_load_chart.png"):
+    """Generates a bar chart of meeting hours per day."""
+    if not daily_meeting_hours:
+        logging.warning("No meeting load data to generate chart.")
+        return None
+
+    labels, hours = zip(*daily_meeting_hours.items())
+    plt.figure(figsize=(10, 6))
+    plt.bar(labels, hours, color='#0ea5e9')
+    plt.xticks(rotation=45, ha='right')
+    plt.xlabel('Day')
+    plt.ylabel('Meeting hours')
+    plt.title('Meeting Load')
+    plt.tight_layout()
+    plt.savefig(output_path)
+    plt.close()
+    logging.info(f"Generated meeting load chart at {output_path}")
+    return output_path
+
 # Email Sending
 def send_email(sender_email, sender_password, recipient_email, subject, html_content, chart_files=None):
     """Sends an HTML email with optional chart attachments."""
@@ -672,57 +1928,97 @@ async def main():
     
     # Authenticate with Google services
     creds = authenticate_gmail()
-    gmail_service = build("gmail", "v1", credentials=creds)
-    calendar_service = build("calendar", "v3", credentials=creds)
+    gmail_service = google_services.build("gmail", "v1", creds)
+    calendar_service = google_services.build("calendar", "v3", creds)
     logging.info('Authenticated with Google services.')
 
     time_window_days = 14
     end_time = datetime.datetime.now(datetime.timezone.utc)
     start_time = end_time - datetime.timedelta(days=time_window_days)
 
-    # Fetch emails
-    msgs = await fetch_recent_messages(gmail_service, days=time_window_days)
-    if not msgs:
+    user_email = os.getenv("SENDER_EMAIL_ADDRESS")
+
+    # Fetch emails and stream them through filtering, NLP and aggregation
+    emails_by_thread = None
+    if GMAIL_INGESTION_MODE == 'threads':
+        thread_stubs = await list_ids_sharded(gmail_service, 'threads', days=time_window_days)
+        emails_by_thread = await get_thread_details_batch(gmail_service, [t['id'] for t in thread_stubs], window_start=start_time)
+        email_source = iterate_emails([email_data for thread_emails in emails_by_thread.values() for email_data in thread_emails])
+    elif GMAIL_INCREMENTAL_SYNC:
+        email_source = iter_synced_messages(gmail_service, days=time_window_days)
+    else:
+        msgs = await list_ids_sharded(gmail_service, 'messages', days=time_window_days)
+        email_source = stream_triaged_message_details(gmail_service, [m['id'] for m in msgs])
+
+    participant_index = ParticipantIndex(ignored_addresses=[user_email])
+    contacts = ContactTable()
+    email_aggregates = await run_email_pipeline(email_source, participant_index=participant_index, contacts=contacts)
+    email_details = email_aggregates['emails']
+    if not email_details and not email_aggregates['filtered_count']:
         logging.info('No recent emails found. Exiting.')
         return
 
-    email_details = []
-    for m in msgs:
-        try:
-            email_data = await get_message_details(gmail_service, m['id'])
-            if email_data and not is_marketing_email(email_data['body'], email_data['subject'], email_data['from_email']):
-                email_details.append(email_data)
-            time.sleep(0.1)  # Rate limiting
-        except Exception as e:
-            logging.error(f"Error processing email {m['id']}: {e}")
-            continue
+    if emails_by_thread is not None:
+        kept_ids = {email_data['id'] for email_data in email_details}
+        emails_by_thread = {
+            thread_id: [email_data for email_data in thread_emails if email_data['id'] in kept_ids]
+            for thread_id, thread_emails in emails_by_thread.items()
+        }
+        emails_by_thread = {thread_id: thread_emails for thread_id, thread_emails in emails_by_thread.items() if thread_emails}
 
     logging.info(f'Processed {len(email_details)} emails.')
+    if email_aggregates['marketing_rules']:
+        logging.info(f"Marketing rules fired: {dict(email_aggregates['marketing_rules'].most_common(10))}")
+    quoted_links = link_quoted_messages(email_details, threads=emails_by_thread)
+    stripped_chars = sum(email_data.get('quoted_chars', 0) for email_data in email_details)
+    logging.info(f'Stripped {stripped_chars} characters of quoted history; linked {quoted_links} replies and forwards to their source.')
+    reputation = get_sender_reputation()
+    if reputation:
+        reputation.save()
+        logging.info(f'Sender reputation: {reputation.hits} of {reputation.lookups} lookups hit ({reputation.hit_rate():.1%}).')
+    header_cache = decode_encoded_header.cache_info()
+    header_lookups = header_cache.hits + header_cache.misses
+    logging.info(
+        f"Header decoding: {header_decode_stats['fast_path']} plain values skipped, "
+        f"{header_cache.hits} of {header_lookups} encoded values from cache "
+        f"({header_cache.hits / header_lookups if header_lookups else 0:.1%})."
+    )
+    signature_templates = get_signature_templates()
+    if signature_templates:
+        signature_templates.save()
+        logging.info(f'Stripped {signature_templates.stripped_lines} signature lines.')
 
     # Fetch calendar events
-    calendar_events = await fetch_calendar_events(calendar_service, start_time, end_time)
+    # The calendar window also covers the week ahead that get_upcoming_meetings looks at
+    calendar_end_time = end_time + datetime.timedelta(days=7)
+    if CALENDAR_SCOPE == 'selected':
+        calendar_ids = await list_selected_calendars(calendar_service)
+    else:
+        calendar_ids = ['primary']
+    if CALENDAR_INCREMENTAL_SYNC:
+        calendar_events = await sync_calendar_events(calendar_service, start_time, calendar_end_time, calendar_ids)
+    else:
+        calendar_events = await fetch_all_calendar_events(calendar_service, start_time, calendar_end_time, calendar_ids)
     logging.info(f'Fetched {len(calendar_events)} calendar events.')
 
     # Perform analysis
-    user_email = os.getenv("SENDER_EMAIL_ADDRESS")
     top_email_exchange_contacts, avg_response_times, name_to_email_map, emails_awaiting_response = \
-        analyze_email_interactions(email_details, user_email)
+        analyze_email_interactions(email_details, user_email, threads=emails_by_thread, contacts=contacts)
 
-    upcoming_meetings = get_upcoming_meetings(calendar_events, user_email)
+    calendar_idx = CalendarIndex(calendar_events)
+    upcoming_meetings = get_upcoming_meetings(calendar_events, user_email, calendar_index=calendar_idx, participant_index=participant_index)
+    upcoming_conflicts = get_upcoming_conflicts(CalendarIndex(busy_events(calendar_events, user_email)))
+    # Other people's calendars and declined invites are not the user's meeting load
+    user_meetings = [event for event in calendar_events if attends_event(event, user_email)]
+    meeting_load = compute_meeting_analytics(user_meetings, start_time, calendar_end_time)
 
     # Aggregate key people and organizations
-    key_people_combined = Counter()
-    key_organizations_combined = Counter()
-    
-    for email_entry in email_details:
-        if email_entry['from_name'] and email_entry['from_email'] and not any(pattern in email_entry['from_email'].lower() for pattern in ["noreply", "info@", "support@", "marketing@"]):
-            key_people_combined[email_entry['from_name']] += 1
-        people_in_body, orgs_in_body = extract_entities(email_entry['body'])
-        for person in people_in_body: 
-            key_people_combined[person] += 1
-        for org in orgs_in_body: 
-            key_organizations_combined[org] += 1
+    key_people_combined = email_aggregates['key_people']
+    key_organizations_combined = email_aggregates['key_organizations']
+    keyword_counts = email_aggregates['keyword_counts']
 
+    # Instances of a recurring series share their text, so run NLP once per series
+    series_analysis = {}
     for event in calendar_events:
         if event['organizer_name'] and event['organizer_email']:
              key_people_combined[event['organizer_name']] += 1
@@ -731,34 +2027,39 @@ async def main():
                 key_people_combined[attendee['name']] += 1
         
         event_text = event['summary'] + " " + event['description']
-        people_in_event, orgs_in_event = extract_entities(event_text)
+        series_key = (event.get('recurring_event_id') or event.get('ical_uid') or event['id'], event_text)
+        if series_key not in series_analysis:
+            series_analysis[series_key] = (extract_entities(event_text), tokenize_for_themes(clean_text(event_text)))
+        (people_in_event, orgs_in_event), event_tokens = series_analysis[series_key]
         for person in people_in_event: 
             key_people_combined[person] += 1
         for org in orgs_in_event: 
             key_organizations_combined[org] += 1
+        keyword_counts.update(event_tokens)
 
-    # Extract themes
-    combined_text_for_themes = " ".join([e['body'] for e in email_details])
-    combined_text_for_themes += " ".join([clean_text(e['summary'] + " " + e['description']) for e in calendar_events])
-    themes = extract_keywords_for_themes(combined_text_for_themes, num_keywords=20)
+    # Extract themes from the keyword counts accumulated per email and event
+    themes = [word for word, count in keyword_counts.most_common(20)]
 
     # Generate topic chart
-    topic_counts = Counter()
-    for theme in themes:
-        topic_counts[theme] = combined_text_for_themes.lower().count(theme.lower())
+    topic_counts = Counter({theme: keyword_counts[theme] for theme in themes})
     
     chart_files = {}
     chart_path = generate_topic_chart(topic_counts.most_common(10))
     if chart_path:
         chart_files['topic_chart'] = chart_path
+    meeting_chart_path = generate_meeting_load_chart(meeting_load.get('daily_meeting_hours'))
+    if meeting_chart_path:
+        chart_files['meeting_load_chart'] = meeting_chart_path
 
     # Prepare data for LLM
     llm_input_data = {
-        "emails": email_details,
+        "emails": [{field: email_data.get(field) for field in LLM_EMAIL_FIELDS} for email_data in email_details],
         "calendar_events": calendar_events,
         "top_email_contacts": [{"contact": contact, "count": count} for contact, count in top_email_exchange_contacts],
         "emails_awaiting_response": emails_awaiting_response,
         "upcoming_meetings": upcoming_meetings,
+        "upcoming_conflicts": upcoming_conflicts,
+        "meeting_load": meeting_load,
         "key_organizations": [{"org": org, "count": count} for org, count in key_organizations_combined.most_common(10)],
         "top_themes_keywords": themes
     }
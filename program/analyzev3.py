@@ -10,6 +10,7 @@ from googleapiclient.errors import HttpError
 import datetime
 import time
 import json
+from message_cache import MessageCache
 import matplotlib.pyplot as plt
 import smtplib
 from email.mime.multipart import MIMEMultipart
@@ -313,7 +314,6 @@ def fetch_and_process_calendar_events(service, time_min, time_max):
                 'status': event.get('status')
             }
             processed_events.append(event_data)
-            time.sleep(0.05)
 
         page_token = events_result.get('nextPageToken')
         if not page_token:
@@ -1026,6 +1026,7 @@ async def generate_manager_briefing_data():
             return
 
         all_processed_emails_data = []
+        message_cache = MessageCache("analyzev3", 1)
         all_processed_calendar_data = []
 
         time_window_days = 14 # Set to 14 days for broader context
@@ -1073,62 +1074,66 @@ async def generate_manager_briefing_data():
                 msg_id = message["id"]
                 thread_id = message["threadId"]
                 
-                try:
-                    msg = gmail_service.users().messages().get(userId="me", id=msg_id, format="full").execute()
-                    time.sleep(0.1)
-                except HttpError as e:
-                    print(f"Error fetching email ID {msg_id}: {e}. Skipping this message.")
-                    continue
-                except Exception as e:
-                    print(f"An unexpected error occurred while fetching email ID {msg_id}: {e}. Skipping this message.")
-                    continue
-
-                headers = msg["payload"]["headers"]
-                subject = ""
-                sender_email = ""
-                sender_name = ""
-                to_recipients = []
-                cc_recipients = []
-                date_sent = ""
-                has_attachments = 'attachmentId' in str(msg["payload"])
-
-                for header in headers:
-                    if header["name"] == "Subject":
-                        subject = decode_email_header(header["value"])
-                    elif header["name"] == "From":
-                        sender_raw = header["value"]
-                        sender_name_match = re.match(r'^(.*?)\s*<([^>]+)>', sender_raw)
-                        if sender_name_match:
-                            sender_name = decode_email_header(sender_name_match.group(1).strip())
-                            sender_email = sender_name_match.group(2)
-                        else:
-                            sender_email = decode_email_header(sender_raw)
-                            sender_name = sender_email
-                    elif header["name"] == "To":
-                        to_recipients = [decode_email_header(r.strip()) for r in header["value"].split(',')]
-                    elif header["name"] == "Cc":
-                        cc_recipients = [decode_email_header(r.strip()) for r in header["value"].split(',')]
-                    elif header["name"] == "Date":
-                        date_sent = decode_email_header(header["value"])
-
-                body = get_email_body_from_gmail_api_payload(msg["payload"])
-                cleaned_body = clean_text(body)
-
-                if is_marketing_email(cleaned_body, subject, sender_email):
+                email_data = message_cache.get(msg_id)
+                if email_data is None:
+                    try:
+                        msg = gmail_service.users().messages().get(userId="me", id=msg_id, format="full").execute()
+                        time.sleep(0.1)
+                    except HttpError as e:
+                        print(f"Error fetching email ID {msg_id}: {e}. Skipping this message.")
+                        continue
+                    except Exception as e:
+                        print(f"An unexpected error occurred while fetching email ID {msg_id}: {e}. Skipping this message.")
+                        continue
+
+                    headers = msg["payload"]["headers"]
+                    subject = ""
+                    sender_email = ""
+                    sender_name = ""
+                    to_recipients = []
+                    cc_recipients = []
+                    date_sent = ""
+                    has_attachments = 'attachmentId' in str(msg["payload"])
+
+                    for header in headers:
+                        if header["name"] == "Subject":
+                            subject = decode_email_header(header["value"])
+                        elif header["name"] == "From":
+                            sender_raw = header["value"]
+                            sender_name_match = re.match(r'^(.*?)\s*<([^>]+)>', sender_raw)
+                            if sender_name_match:
+                                sender_name = decode_email_header(sender_name_match.group(1).strip())
+                                sender_email = sender_name_match.group(2)
+                            else:
+                                sender_email = decode_email_header(sender_raw)
+                                sender_name = sender_email
+                        elif header["name"] == "To":
+                            to_recipients = [decode_email_header(r.strip()) for r in header["value"].split(',')]
+                        elif header["name"] == "Cc":
+                            cc_recipients = [decode_email_header(r.strip()) for r in header["value"].split(',')]
+                        elif header["name"] == "Date":
+                            date_sent = decode_email_header(header["value"])
+
+                    body = get_email_body_from_gmail_api_payload(msg["payload"])
+                    cleaned_body = clean_text(body)
+
+                    email_data = {
+                        'id': msg_id,
+                        'threadId': thread_id,
+                        'subject': subject,
+                        'from_name': sender_name,
+                        'from_email': sender_email,
+                        'to_recipients': to_recipients,
+                        'cc_recipients': cc_recipients,
+                        'date': date_sent,
+                        'body': cleaned_body,
+                        'has_attachments': has_attachments
+                    }
+                    message_cache.put(email_data)
+
+                if is_marketing_email(email_data['body'], email_data['subject'], email_data['from_email']):
                     continue
 
-                email_data = {
-                    'id': msg_id,
-                    'threadId': thread_id,
-                    'subject': subject,
-                    'from_name': sender_name,
-                    'from_email': sender_email,
-                    'to_recipients': to_recipients,
-                    'cc_recipients': cc_recipients,
-                    'date': date_sent,
-                    'body': cleaned_body,
-                    'has_attachments': has_attachments
-                }
                 all_processed_emails_data.append(email_data)
 
             next_page_token_email = results_email.get("nextPageToken")
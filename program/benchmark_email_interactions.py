@@ -0,0 +1,202 @@
+"""
+Benchmark of analyze_email_interactions on a synthetic mailbox with long threads.
+
+Compares the parse-once, linear-pass implementation in analyze_consolidated.py (over
+interned contact ids) with the previous one, which re-parsed Date headers in every sort
+key and loop and regex-parsed every recipient string. Needs the
+analyze_consolidated.py dependencies installed. Run from the program directory:
+
+    python benchmark_email_interactions.py [message_count] [max_thread_length]
+"""
+import re
+import sys
+import time
+import random
+import datetime
+from collections import Counter, defaultdict
+from email.utils import format_datetime, parsedate_to_datetime
+
+from analyze_consolidated import analyze_email_interactions, parse_email_timestamp
+from contact_table import ContactTable
+
+USER_EMAIL = "me@example.com"
+
+
+def build_mailbox(message_count, max_thread_length, seed=0):
+    """Generates parsed email records: threads of 1..max_thread_length messages over the last 14 days."""
+    rng = random.Random(seed)
+    contacts = [(f"Contact {i}", f"contact{i}@example.org") for i in range(500)]
+    now = datetime.datetime.now(datetime.timezone.utc)
+    emails = []
+    thread_number = 0
+    while len(emails) < message_count:
+        thread_number += 1
+        length = min(rng.randint(1, max_thread_length), message_count - len(emails))
+        name, address = rng.choice(contacts)
+        sent = now - datetime.timedelta(days=14) + datetime.timedelta(seconds=rng.randint(0, 10 * 86400))
+        for position in range(length):
+            from_user = position % 2 == 1 and rng.random() < 0.8
+            date_header = format_datetime(sent)
+            emails.append({
+                'id': f"m{len(emails)}",
+                'threadId': f"t{thread_number}",
+                'subject': f"Thread {thread_number}",
+                'from_name': "Me" if from_user else name,
+                'from_email': USER_EMAIL if from_user else address,
+                'to_recipients': [address] if from_user else [USER_EMAIL],
+                'cc_recipients': [f"{name} <{address}>"] if position % 5 == 0 else [],
+                'date': date_header,
+                'timestamp': parse_email_timestamp(date_header)
+            })
+            sent += datetime.timedelta(minutes=rng.randint(5, 600))
+    rng.shuffle(emails)
+    return emails
+
+
+def analyze_email_interactions_baseline(emails_data, user_email, threads=None):
+    """The previous implementation: Date headers re-parsed in every sort and loop, O(n^2) reply check."""
+    email_exchange_counts = defaultdict(int)
+    response_times_per_sender = defaultdict(list)
+    emails_awaiting_response = []
+    
+    presorted = threads is not None
+    if not presorted:
+        threads = defaultdict(list)
+        for email_entry in emails_data:
+            threads[email_entry['threadId']].append(email_entry)
+
+    name_email_associations = defaultdict(Counter)
+
+    for thread_id, email_list in threads.items():
+        if presorted:
+            sorted_emails = email_list
+        else:
+            sorted_emails = sorted(email_list, key=lambda x: parsedate_to_datetime(x['date']) if parsedate_to_datetime(x['date']) else datetime.datetime.min)
+
+        last_incoming_email_info = None
+        
+        for email_entry in sorted_emails:
+            email_date_obj = parsedate_to_datetime(email_entry['date'])
+            if not email_date_obj:
+                continue
+
+            normalized_from_email = email_entry['from_email'].lower()
+            normalized_to_recipients = [r.lower() for r in email_entry['to_recipients']]
+            normalized_cc_recipients = [r.lower() for r in email_entry['cc_recipients']]
+
+            # Populate name_email_associations
+            if email_entry['from_name'] and email_entry['from_email']:
+                name_email_associations[email_entry['from_name']][email_entry['from_email'].lower()] += 1
+            
+            for recipient_full in email_entry['to_recipients'] + email_entry['cc_recipients']:
+                match = re.match(r'^(.*?)\s*<([^>]+)>', recipient_full)
+                if match:
+                    name, email_addr = match.group(1).strip(), match.group(2)
+                    if name: 
+                        name_email_associations[name][email_addr.lower()] += 1
+
+            is_sent_by_user = (normalized_from_email == user_email.lower())
+            is_received_by_user = (user_email.lower() in normalized_to_recipients or user_email.lower() in normalized_cc_recipients)
+
+            if is_sent_by_user:
+                for recipient in normalized_to_recipients + normalized_cc_recipients:
+                    if recipient != user_email.lower():
+                        email_exchange_counts[recipient] += 1
+            elif is_received_by_user:
+                email_exchange_counts[normalized_from_email] += 1
+                
+            if not is_sent_by_user and is_received_by_user:
+                last_incoming_email_info = (email_entry['from_email'], email_date_obj, email_entry['subject'])
+            elif is_sent_by_user and last_incoming_email_info:
+                original_sender_email, incoming_date_obj, _ = last_incoming_email_info
+                if email_date_obj > incoming_date_obj:
+                    response_time = email_date_obj - incoming_date_obj
+                    response_times_per_sender[original_sender_email].append(response_time)
+                last_incoming_email_info = None
+        
+        # Check for emails awaiting response
+        if presorted:
+            sorted_emails_desc = email_list[::-1]
+        else:
+            sorted_emails_desc = sorted(email_list, key=lambda x: parsedate_to_datetime(x['date']) if parsedate_to_datetime(x['date']) else datetime.datetime.min, reverse=True)
+        
+        if sorted_emails_desc:
+            latest_email_in_thread = sorted_emails_desc[0]
+            latest_email_date_obj = parsedate_to_datetime(latest_email_in_thread['date'])
+
+            if latest_email_date_obj:
+                normalized_latest_from_email = latest_email_in_thread['from_email'].lower()
+                normalized_latest_to_recipients = [r.lower() for r in latest_email_in_thread['to_recipients']]
+                normalized_latest_cc_recipients = [r.lower() for r in latest_email_in_thread['cc_recipients']]
+
+                is_latest_sent_by_user = (normalized_latest_from_email == user_email.lower())
+                is_latest_received_by_user = (user_email.lower() in normalized_latest_to_recipients or user_email.lower() in normalized_latest_cc_recipients)
+
+                user_replied_after_this_incoming = False
+                for email_in_thread in sorted_emails:
+                    email_in_thread_date_obj = parsedate_to_datetime(email_in_thread['date'])
+                    if email_in_thread_date_obj and email_in_thread_date_obj > latest_email_date_obj:
+                        if email_in_thread['from_email'].lower() == user_email.lower():
+                            user_replied_after_this_incoming = True
+                            break
+                
+                if is_latest_received_by_user and not is_latest_sent_by_user and not user_replied_after_this_incoming:
+                    time_since_incoming = datetime.datetime.now(datetime.timezone.utc) - latest_email_date_obj
+                    if datetime.timedelta(hours=1) < time_since_incoming < datetime.timedelta(days=14):
+                        emails_awaiting_response.append({
+                            'subject': latest_email_in_thread['subject'],
+                            'sender': latest_email_in_thread['from_email'],
+                            'date': latest_email_date_obj.strftime('%Y-%m-%d %H:%M')
+                        })
+
+    final_name_to_email_map = {}
+    for name, email_counts in name_email_associations.items():
+        if email_counts:
+            final_name_to_email_map[name] = email_counts.most_common(1)[0][0]
+
+    avg_response_times = {}
+    for sender, times in response_times_per_sender.items():
+        if times:
+            total_seconds = sum(t.total_seconds() for t in times)
+            avg_seconds = total_seconds / len(times)
+            
+            if avg_seconds < 60:
+                avg_response_times[sender] = f"{int(avg_seconds)} seconds"
+            elif avg_seconds < 3600:
+                avg_response_times[sender] = f"{int(avg_seconds / 60)} minutes"
+            elif avg_seconds < 86400:
+                avg_response_times[sender] = f"{int(avg_seconds / 3600)} hours"
+            else:
+                avg_response_times[sender] = f"{int(avg_seconds / 86400)} days"
+    
+    top_email_exchange_contacts = Counter(email_exchange_counts).most_common(10)
+    
+    return top_email_exchange_contacts, avg_response_times, final_name_to_email_map, emails_awaiting_response
+
+
+def main():
+    message_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    max_thread_length = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    emails = build_mailbox(message_count, max_thread_length)
+    print(f"{len(emails)} messages in {len({email_data['threadId'] for email_data in emails})} threads")
+
+    # Interning happens once at ingest in the real pipeline, so it is timed on its own
+    started = time.perf_counter()
+    contacts = ContactTable()
+    for email_data in emails:
+        contacts.intern_email(email_data)
+    print(f"{'interning':>10}: {time.perf_counter() - started:7.2f} s ({len(contacts)} contacts)")
+
+    results = {}
+    for name, analyze in (('baseline', analyze_email_interactions_baseline), ('parse-once', analyze_email_interactions)):
+        started = time.perf_counter()
+        results[name] = analyze(emails, USER_EMAIL, contacts=contacts) if name == 'parse-once' else analyze(emails, USER_EMAIL)
+        elapsed = time.perf_counter() - started
+        print(f"{name:>10}: {elapsed:7.2f} s")
+    # Top contacts differ by design: the baseline keyed named recipients by their full "Name <addr>" string
+    baseline, current = results['baseline'], results['parse-once']
+    print(f"response times and awaiting-response match: {baseline[1] == current[1] and baseline[3] == current[3]}")
+
+
+if __name__ == "__main__":
+    main()
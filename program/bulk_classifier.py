@@ -0,0 +1,99 @@
+import re
+import zlib
+import logging
+
+import numpy as np
+
+DEFAULT_FEATURE_BUCKETS = 2 ** 18
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+_DIGITS_PATTERN = re.compile(r'\d+')
+
+
+def message_features(record):
+    """
+    Header-level features of a message record (metadata triage dict or parsed email):
+    subject words and word pairs, sender local part and domain, display-name words,
+    recipient counts and bulk-mail headers when the record has them.
+    """
+    features = []
+    subject = _DIGITS_PATTERN.sub('0', (record.get('subject') or '').lower())
+    words = _TOKEN_PATTERN.findall(subject)
+    features.extend(f's:{word}' for word in words)
+    features.extend(f's2:{first}_{second}' for first, second in zip(words, words[1:]))
+    features.append(f'slen:{min(len(words), 20) // 4}')
+    if subject.startswith(('re:', 'fwd:', 'fw:')):
+        features.append('s:is_reply')
+
+    sender = (record.get('from_email') or '').lower()
+    local_part, _, domain = sender.rpartition('@')
+    features.append(f'fl:{_DIGITS_PATTERN.sub("0", local_part)}')
+    features.append(f'fd:{domain}')
+    features.append(f'fd2:{".".join(domain.split(".")[-2:])}')
+    features.extend(f'fn:{word}' for word in _TOKEN_PATTERN.findall((record.get('from_name') or '').lower()))
+
+    if 'to_recipients' in record:
+        features.append(f'to:{min(len(record["to_recipients"]), 5)}')
+        features.append(f'cc:{min(len(record.get("cc_recipients", [])), 5)}')
+    for flag in ('has_list_unsubscribe', 'has_list_id', 'is_bulk_precedence'):
+        if record.get(flag):
+            features.append(f'h:{flag}')
+    return features
+
+
+def feature_buckets(features, buckets):
+    """Hashes feature strings into distinct bucket ids (crc32, stable across runs)."""
+    return np.unique(np.fromiter((zlib.crc32(feature.encode('utf-8')) for feature in features), dtype=np.int64, count=len(features)) % buckets)
+
+
+class BulkMailClassifier:
+    """
+    Multinomial naive Bayes over hashed header features, scored in vectorised batches.
+
+    Weights are per-bucket log-likelihood ratios (marketing vs. personal), so the score of
+    a message is the bias plus a sum of weights: a batch of messages becomes one
+    bincount over (row, bucket) pairs. Trained offline by train_bulk_classifier.py.
+    """
+
+    def __init__(self, weights, bias, buckets=DEFAULT_FEATURE_BUCKETS):
+        self.weights = weights
+        self.bias = bias
+        self.buckets = buckets
+
+    @classmethod
+    def train(cls, records, labels, buckets=DEFAULT_FEATURE_BUCKETS, alpha=1.0):
+        """Fits the model to records labelled True (marketing/bulk) or False."""
+        labels = np.asarray(labels, dtype=bool)
+        counts = np.zeros((2, buckets), dtype=np.float64)
+        for record, label in zip(records, labels):
+            counts[int(label)][feature_buckets(message_features(record), buckets)] += 1
+        totals = counts.sum(axis=1, keepdims=True)
+        log_likelihood = np.log(counts + alpha) - np.log(totals + alpha * buckets)
+        weights = (log_likelihood[1] - log_likelihood[0]).astype(np.float32)
+        positives = int(labels.sum())
+        bias = float(np.log(positives + 1) - np.log(len(labels) - positives + 1))
+        return cls(weights, bias, buckets)
+
+    def score_batch(self, records):
+        """Returns the probability that each record is marketing/bulk mail, as a NumPy array."""
+        if not records:
+            return np.zeros(0)
+        row_buckets = [feature_buckets(message_features(record), self.buckets) for record in records]
+        rows = np.repeat(np.arange(len(records)), [len(bucket_ids) for bucket_ids in row_buckets])
+        log_odds = np.bincount(rows, weights=self.weights[np.concatenate(row_buckets)], minlength=len(records)) + self.bias
+        return 1 / (1 + np.exp(-np.clip(log_odds, -50, 50)))
+
+    def save(self, path):
+        np.savez_compressed(path, weights=self.weights, bias=self.bias, buckets=self.buckets)
+
+    @classmethod
+    def load(cls, path):
+        """Loads a saved model, or returns None when the file is missing or unreadable."""
+        try:
+            with np.load(path) as data:
+                return cls(data['weights'], float(data['bias']), int(data['buckets']))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Could not load bulk-mail classifier from {path}: {e}")
+            return None
@@ -0,0 +1,148 @@
+import datetime
+
+import numpy as np
+
+from calendar_index import parse_event_epoch, to_epoch
+
+SECONDS_PER_DAY = 86400
+MINUTES_PER_DAY = 1440
+
+
+def build_event_arrays(events):
+    """
+    Converts timed (non all-day, non-cancelled) event dicts into parallel NumPy arrays.
+    Returns (starts, ends, attendee_counts, timed_events); times are epoch seconds and
+    an event without an attendee list counts as one person.
+    """
+    timed_events = []
+    starts = []
+    ends = []
+    attendee_counts = []
+    for event in events:
+        if event.get('status') == 'cancelled' or 'T' not in event.get('start_time', ''):
+            continue
+        try:
+            start = parse_event_epoch(event['start_time'])
+            end = parse_event_epoch(event['end_time'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        timed_events.append(event)
+        starts.append(start)
+        ends.append(max(start, end))
+        attendee_counts.append(max(1, len(event.get('attendees', []))))
+    return (
+        np.array(starts, dtype=np.int64),
+        np.array(ends, dtype=np.int64),
+        np.array(attendee_counts, dtype=np.int64),
+        timed_events
+    )
+
+
+def local_date_label(epoch_seconds, utc_offset_seconds):
+    return datetime.datetime.fromtimestamp(int(epoch_seconds) + utc_offset_seconds, datetime.timezone.utc).strftime('%Y-%m-%d')
+
+
+def local_time_label(epoch_seconds, utc_offset_seconds):
+    return datetime.datetime.fromtimestamp(int(epoch_seconds) + utc_offset_seconds, datetime.timezone.utc).strftime('%Y-%m-%d %H:%M')
+
+
+def compute_meeting_analytics(events, window_start=None, window_end=None, utc_offset_seconds=None,
+                              workday_start_hour=9, workday_end_hour=17,
+                              focus_block_minutes=90, back_to_back_gap_minutes=5):
+    """
+    Computes meeting-load metrics for the brief with vectorised NumPy operations.
+
+    Events are laid onto a per-minute timeline (aligned to local midnight) with a
+    difference array, so daily and hourly load, double-booking and focus blocks are
+    reductions over one array rather than Python loops over events. Back-to-back
+    streaks come from gaps between consecutive meetings, and meeting cost is
+    attendees x duration in person-hours. Returns a JSON-serialisable dict.
+    """
+    if utc_offset_seconds is None:
+        utc_offset_seconds = int(datetime.datetime.now().astimezone().utcoffset().total_seconds())
+    starts, ends, attendee_counts, _ = build_event_arrays(events)
+
+    if window_start is None or window_end is None:
+        if not len(starts):
+            return {}
+        window_start = starts.min() if window_start is None else window_start
+        window_end = ends.max() if window_end is None else window_end
+    window_start, window_end = to_epoch(window_start), to_epoch(window_end)
+
+    in_window = (ends > window_start) & (starts < window_end)
+    starts, ends, attendee_counts = starts[in_window], ends[in_window], attendee_counts[in_window]
+
+    # Per-minute timeline from local midnight of the first day to the end of the last day
+    first_day = ((window_start + utc_offset_seconds) // SECONDS_PER_DAY) * SECONDS_PER_DAY - utc_offset_seconds
+    day_count = max(1, -(-(window_end - first_day) // SECONDS_PER_DAY))
+    timeline_minutes = day_count * MINUTES_PER_DAY
+    start_minutes = np.clip((starts - first_day) // 60, 0, timeline_minutes)
+    end_minutes = np.clip(-(-(ends - first_day) // 60), 0, timeline_minutes)
+
+    change = np.zeros(timeline_minutes + 1, dtype=np.int32)
+    np.add.at(change, start_minutes, 1)
+    np.add.at(change, end_minutes, -1)
+    concurrency = np.cumsum(change)[:-1]
+    busy = concurrency > 0
+    busy_by_day = busy.reshape(day_count, 24, 60)
+
+    day_labels = [local_date_label(first_day + day * SECONDS_PER_DAY, utc_offset_seconds) for day in range(day_count)]
+    daily_meeting_hours = busy_by_day.sum(axis=(1, 2)) / 60
+    hourly_meeting_minutes = busy_by_day.sum(axis=(0, 2))
+
+    # Focus blocks: free stretches inside weekday working hours (epoch day 0 was a Thursday)
+    minute_of_day = np.arange(MINUTES_PER_DAY)
+    working_minutes = (minute_of_day >= workday_start_hour * 60) & (minute_of_day < workday_end_hour * 60)
+    weekdays = (((first_day + utc_offset_seconds) // SECONDS_PER_DAY + np.arange(day_count)) + 3) % 7
+    working_time = (working_minutes[np.newaxis, :] & (weekdays < 5)[:, np.newaxis]).ravel()
+    free = np.concatenate(([0], (working_time & ~busy).astype(np.int8), [0]))
+    edges = np.diff(free)
+    run_starts = np.flatnonzero(edges == 1)
+    run_lengths = np.flatnonzero(edges == -1) - run_starts
+    long_runs = run_lengths >= focus_block_minutes
+    focus_blocks = [
+        {
+            'start': local_time_label(first_day + run_start * 60, utc_offset_seconds),
+            'end': local_time_label(first_day + (run_start + run_length) * 60, utc_offset_seconds),
+            'minutes': int(run_length)
+        }
+        for run_start, run_length in zip(run_starts[long_runs], run_lengths[long_runs])
+    ]
+
+    # Back-to-back streaks: consecutive meetings separated by at most the allowed gap
+    order = np.argsort(starts, kind='stable')
+    sorted_starts, sorted_ends = starts[order], ends[order]
+    streaks = []
+    if len(sorted_starts):
+        latest_end = np.maximum.accumulate(sorted_ends)
+        breaks = (sorted_starts[1:] - latest_end[:-1]) > back_to_back_gap_minutes * 60
+        streak_ids = np.concatenate(([0], np.cumsum(breaks)))
+        streak_sizes = np.bincount(streak_ids)
+        streak_first = np.flatnonzero(np.concatenate(([True], breaks)))
+        streak_last_end = np.maximum.reduceat(sorted_ends, streak_first)
+        for streak_id in np.flatnonzero(streak_sizes >= 2):
+            streaks.append({
+                'start': local_time_label(sorted_starts[streak_first[streak_id]], utc_offset_seconds),
+                'end': local_time_label(streak_last_end[streak_id], utc_offset_seconds),
+                'meetings': int(streak_sizes[streak_id])
+            })
+    streaks.sort(key=lambda streak: streak['meetings'], reverse=True)
+
+    # Meeting cost in person-hours, attributed to the day each meeting starts
+    person_hours = (ends - starts) / 3600 * attendee_counts
+    start_days = np.clip((starts - first_day) // SECONDS_PER_DAY, 0, day_count - 1)
+    daily_cost = np.bincount(start_days, weights=person_hours, minlength=day_count)
+
+    return {
+        'meeting_count': int(len(starts)),
+        'daily_meeting_hours': {label: round(float(hours), 2) for label, hours in zip(day_labels, daily_meeting_hours)},
+        'hourly_meeting_minutes': [int(minutes) for minutes in hourly_meeting_minutes],
+        'double_booked_hours': round(float((concurrency > 1).sum()) / 60, 2),
+        'back_to_back_streak_count': len(streaks),
+        'longest_back_to_back_streak': streaks[0]['meetings'] if streaks else 0,
+        'back_to_back_streaks': streaks[:5],
+        'focus_blocks': focus_blocks,
+        'focus_hours': round(float(run_lengths[long_runs].sum()) / 60, 2),
+        'meeting_cost_person_hours': round(float(person_hours.sum()), 2),
+        'daily_meeting_cost_person_hours': {label: round(float(cost), 2) for label, cost in zip(day_labels, daily_cost)}
+    }
@@ -0,0 +1,157 @@
+import bisect
+import datetime
+import heapq
+import logging
+
+SECONDS_PER_DAY = 86400
+
+
+def parse_event_epoch(value):
+    """Parses a Calendar dateTime or all-day date string into epoch seconds (dates are UTC midnight)."""
+    if 'T' in value:
+        parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    else:
+        parsed = datetime.datetime.strptime(value, '%Y-%m-%d')
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return int(parsed.timestamp())
+
+
+def to_epoch(value):
+    """Accepts epoch seconds or an aware datetime and returns epoch seconds."""
+    if isinstance(value, datetime.datetime):
+        return int(value.timestamp())
+    return int(value)
+
+
+class CalendarIndex:
+    """
+    Read-only index over calendar event dicts for time-range queries.
+
+    Each event's start_time/end_time strings are parsed once into epoch seconds and kept
+    in arrays sorted by start. A max-end segment tree over those arrays acts as an
+    interval tree, and the union of busy time is precomputed as disjoint intervals, so
+    range, overlap and free-slot queries cost O(log n + k) instead of a full scan.
+    """
+
+    def __init__(self, events):
+        parsed = []
+        for event in events:
+            if event.get('status') == 'cancelled':
+                continue
+            try:
+                start = parse_event_epoch(event['start_time'])
+                end = parse_event_epoch(event['end_time'])
+            except (KeyError, TypeError, ValueError) as e:
+                logging.warning(f"Could not index calendar event '{event.get('summary', 'N/A')}': {e}")
+                continue
+            parsed.append((start, max(start, end), event))
+        parsed.sort(key=lambda item: item[0])
+
+        self.starts = [start for start, _, _ in parsed]
+        self.ends = [end for _, end, _ in parsed]
+        self.events = [event for _, _, event in parsed]
+        self._build_max_end_tree()
+        self.busy_starts, self.busy_ends = self._merge_busy_intervals()
+
+    def __len__(self):
+        return len(self.events)
+
+    def _build_max_end_tree(self):
+        """Builds an iterative segment tree holding the latest end time of each index range."""
+        size = 1
+        while size < max(1, len(self.ends)):
+            size *= 2
+        self._tree_size = size
+        self._max_end = [float('-inf')] * (2 * size)
+        self._max_end[size:size + len(self.ends)] = self.ends
+        for node in range(size - 1, 0, -1):
+            self._max_end[node] = max(self._max_end[2 * node], self._max_end[2 * node + 1])
+
+    def _merge_busy_intervals(self):
+        busy_starts = []
+        busy_ends = []
+        for start, end in zip(self.starts, self.ends):
+            if busy_ends and start <= busy_ends[-1]:
+                busy_ends[-1] = max(busy_ends[-1], end)
+            else:
+                busy_starts.append(start)
+                busy_ends.append(end)
+        return busy_starts, busy_ends
+
+    def epochs(self, position):
+        """Returns (start, end) epoch seconds of the event at an index position."""
+        return self.starts[position], self.ends[position]
+
+    def starting_between(self, start, end):
+        """Returns events whose start lies in [start, end), ordered by start."""
+        low = bisect.bisect_left(self.starts, to_epoch(start))
+        high = bisect.bisect_left(self.starts, to_epoch(end))
+        return self.events[low:high]
+
+    def next_days(self, days, now=None):
+        """Returns events starting after now and within the next `days` days."""
+        now = to_epoch(now if now is not None else datetime.datetime.now(datetime.timezone.utc))
+        low = bisect.bisect_right(self.starts, now)
+        high = bisect.bisect_left(self.starts, now + days * SECONDS_PER_DAY)
+        return self.events[low:high]
+
+    def overlapping_positions(self, start, end):
+        """Returns index positions of events overlapping [start, end), ordered by start."""
+        start, end = to_epoch(start), to_epoch(end)
+        # Only events starting before `end` can overlap; of those, keep the ones ending after `start`
+        limit = bisect.bisect_left(self.starts, end)
+        positions = []
+        stack = [(1, 0, self._tree_size)]
+        while stack:
+            node, node_low, node_high = stack.pop()
+            if node_low >= limit or self._max_end[node] <= start:
+                continue
+            if node_high - node_low == 1:
+                positions.append(node_low)
+                continue
+            middle = (node_low + node_high) // 2
+            stack.append((2 * node + 1, middle, node_high))
+            stack.append((2 * node, node_low, middle))
+        return positions
+
+    def overlapping(self, start, end):
+        """Returns events overlapping [start, end), ordered by start."""
+        return [self.events[position] for position in self.overlapping_positions(start, end)]
+
+    def conflicts(self, start=None, end=None):
+        """
+        Returns (earlier_event, later_event) pairs that overlap in time, optionally limited
+        to events overlapping [start, end). Runs as a sweep over the sorted starts.
+        """
+        if start is None or end is None:
+            positions = range(len(self.events))
+        else:
+            positions = self.overlapping_positions(start, end)
+        conflicts = []
+        active = []
+        for position in positions:
+            event_start, event_end = self.starts[position], self.ends[position]
+            while active and active[0][0] <= event_start:
+                heapq.heappop(active)
+            for _, other_position in active:
+                conflicts.append((self.events[other_position], self.events[position]))
+            heapq.heappush(active, (event_end, position))
+        return conflicts
+
+    def free_slots(self, start, end, min_duration_seconds=0):
+        """Returns (slot_start, slot_end) epoch pairs inside [start, end) not covered by any event."""
+        start, end = to_epoch(start), to_epoch(end)
+        slots = []
+        cursor = start
+        position = max(0, bisect.bisect_right(self.busy_starts, start) - 1)
+        while position < len(self.busy_starts) and self.busy_starts[position] < end:
+            busy_start, busy_end = self.busy_starts[position], self.busy_ends[position]
+            if busy_end > cursor:
+                if busy_start - cursor >= max(1, min_duration_seconds):
+                    slots.append((cursor, busy_start))
+                cursor = max(cursor, busy_end)
+            position += 1
+        if end - cursor >= max(1, min_duration_seconds):
+            slots.append((cursor, end))
+        return slots
@@ -0,0 +1,110 @@
+import datetime
+import logging
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from dateutil.rrule import rrulestr
+
+
+def parse_calendar_datetime(value, timezone_name=None):
+    """
+    Parses a Calendar dateTime into an aware datetime in the event's own time zone, so
+    recurrences keep their wall-clock time across DST changes.
+    """
+    parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    if timezone_name:
+        try:
+            return parsed.astimezone(ZoneInfo(timezone_name))
+        except ZoneInfoNotFoundError:
+            logging.warning(f"Unknown calendar time zone '{timezone_name}', keeping the UTC offset.")
+    return parsed
+
+
+def occurrence_starts(master, time_min, time_max):
+    """
+    Returns the start datetimes of a recurring master's instances overlapping [time_min, time_max).
+    Timed series are expanded as aware datetimes; all-day series as naive midnights.
+    """
+    all_day = 'T' not in master['start_time']
+    if all_day:
+        dtstart = datetime.datetime.strptime(master['start_time'], '%Y-%m-%d')
+        duration = datetime.datetime.strptime(master['end_time'], '%Y-%m-%d') - dtstart
+        window_start = time_min.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        window_end = time_max.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    else:
+        dtstart = parse_calendar_datetime(master['start_time'], master.get('start_timezone'))
+        duration = parse_calendar_datetime(master['end_time']) - dtstart
+        window_start, window_end = time_min, time_max
+
+    rules = rrulestr("\n".join(master['recurrence']), dtstart=dtstart, forceset=True)
+    return [
+        start for start in rules.between(window_start - duration, window_end, inc=True)
+        if start + duration > window_start and start < window_end
+    ], duration, all_day
+
+
+def instance_key(recurring_event_id, start_value):
+    """Identifies one instance of a series by its master id and original start (epoch seconds)."""
+    if 'T' in start_value:
+        return recurring_event_id, int(parse_calendar_datetime(start_value).timestamp())
+    return recurring_event_id, int(datetime.datetime.strptime(start_value, '%Y-%m-%d').replace(tzinfo=datetime.timezone.utc).timestamp())
+
+
+def make_instance(master, start, duration, all_day):
+    """Builds one instance dict of a recurring master, sharing all of its other fields."""
+    if all_day:
+        start_time = start.date().isoformat()
+        end_time = (start + duration).date().isoformat()
+        stamp = start.strftime('%Y%m%d')
+    else:
+        start_time = start.isoformat()
+        end_time = (start + duration).isoformat()
+        stamp = start.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    return dict(
+        master,
+        id=f"{master['id']}_{stamp}",
+        start_time=start_time,
+        end_time=end_time,
+        recurrence=[],
+        recurring_event_id=master['id'],
+        original_start_time=start_time
+    )
+
+
+def expand_recurring_events(events, time_min, time_max):
+    """
+    Replaces recurring masters (fetched with singleEvents=False) by their instances in
+    [time_min, time_max), expanding RRULE/RDATE/EXDATE locally. Modified instances
+    returned by the API override the generated ones and cancelled instances remove them.
+    Events that are neither masters nor exceptions pass through unchanged.
+    """
+    masters = []
+    exceptions = {}
+    expanded = []
+    for event_data in events:
+        if event_data.get('recurrence'):
+            masters.append(event_data)
+        elif event_data.get('recurring_event_id') and event_data.get('original_start_time'):
+            exceptions[instance_key(event_data['recurring_event_id'], event_data['original_start_time'])] = event_data
+        elif event_data.get('status') != 'cancelled':
+            expanded.append(event_data)
+
+    for master in masters:
+        try:
+            starts, duration, all_day = occurrence_starts(master, time_min, time_max)
+        except (KeyError, TypeError, ValueError) as e:
+            logging.warning(f"Could not expand recurring event '{master.get('summary', 'N/A')}': {e}")
+            expanded.append(master)
+            continue
+        for start in starts:
+            instance = make_instance(master, start, duration, all_day)
+            exception = exceptions.pop(instance_key(master['id'], instance['start_time']), None)
+            if exception is None:
+                expanded.append(instance)
+            elif exception.get('status') != 'cancelled':
+                expanded.append(exception)
+
+    # Modified instances whose original slot fell outside the window may have moved into it
+    expanded.extend(exception for exception in exceptions.values() if exception.get('status') != 'cancelled' and exception.get('start_time'))
+    return expanded
@@ -0,0 +1,89 @@
+import re
+import threading
+from collections import Counter
+from email.utils import getaddresses
+
+from participant_index import normalize_address
+
+# The common recipient forms, "addr" and "Name <addr>" (name optionally quoted, without
+# commas or quotes inside); anything else goes through email.utils.getaddresses, which is
+# far slower per address.
+_SIMPLE_ADDRESS_PATTERN = re.compile(
+    r'\s*(?:"?([^"<>,]*?)"?\s*<([^<>\s,"]+@[^<>\s,"]+)>|([^<>\s,"]+@[^<>\s,"]+))\s*'
+)
+
+
+class ContactTable:
+    """
+    Interned identities for every address seen during a run.
+
+    Each normalised address gets a small integer id the first time it is seen, along with
+    counts of the display names used with it. Emails reference their sender and
+    recipients by id, so analysis compares integers instead of lower-casing and
+    regex-parsing "Name <addr>" strings on every pass.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.addresses = []
+        self.names = []
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def intern(self, address, name=''):
+        """Returns the id for address (creating it if new) and counts the display name; None for an empty address."""
+        key = normalize_address(address)
+        if not key:
+            return None
+        with self.lock:
+            contact_id = self.ids.get(key)
+            if contact_id is None:
+                contact_id = self.ids[key] = len(self.addresses)
+                self.addresses.append(key)
+                self.names.append(Counter())
+            name = (name or '').strip()
+            if name and name.lower() != key:
+                self.names[contact_id][name] += 1
+        return contact_id
+
+    def id_of(self, address):
+        """Returns the id of a known address without adding it, or None."""
+        return self.ids.get(normalize_address(address))
+
+    def address(self, contact_id):
+        return self.addresses[contact_id]
+
+    def intern_recipients(self, recipients):
+        """
+        Parses a list of recipient strings and returns their ids, in order. Simple forms
+        are matched by one precompiled pattern; the rest fall back to getaddresses.
+        """
+        contact_ids = []
+        for recipient in recipients:
+            match = _SIMPLE_ADDRESS_PATTERN.fullmatch(recipient)
+            if match:
+                parsed = [(match.group(1) or '', match.group(2) or match.group(3))]
+            else:
+                parsed = getaddresses([recipient])
+            for name, address in parsed:
+                contact_id = self.intern(address, name)
+                if contact_id is not None:
+                    contact_ids.append(contact_id)
+        return contact_ids
+
+    def intern_email(self, email_data):
+        """Adds 'from_id', 'to_ids' and 'cc_ids' to a parsed email record."""
+        email_data['from_id'] = self.intern(email_data.get('from_email'), email_data.get('from_name'))
+        email_data['to_ids'] = self.intern_recipients(email_data.get('to_recipients', []))
+        email_data['cc_ids'] = self.intern_recipients(email_data.get('cc_recipients', []))
+        return email_data
+
+    def name_to_address(self):
+        """Maps each display name to the address it was most often used with."""
+        name_counts = {}
+        for contact_id, names in enumerate(self.names):
+            for name, count in names.items():
+                name_counts.setdefault(name, Counter())[self.addresses[contact_id]] += count
+        return {name: counts.most_common(1)[0][0] for name, counts in name_counts.items()}
@@ -0,0 +1,69 @@
+import re
+
+# Header lines left in bodies by forwards and inline replies. They only count as headers
+# at the start of a line, so "To:" inside a sentence no longer truncates the text.
+HEADER_NAMES = ('Subject', 'From', 'To', 'Date', 'Content-Type')
+
+_HEADER_LINE_PATTERN = re.compile(
+    r'^[ \t]*(?:' + '|'.join(HEADER_NAMES) + r'):[^\n]*',
+    re.MULTILINE
+)
+
+
+def clean_text(text):
+    """
+    Removes common email artifacts and cleans text for NLP.
+    Header lines are dropped in one scan of a precompiled pattern, then str.split/join
+    collapses every whitespace run (newlines included) to a single space.
+    """
+    return ' '.join(_HEADER_LINE_PATTERN.sub('', text).split())
+
+
+# Where quoted history starts in a reply or forward. Attribution lines must carry a year so
+# that "on Monday she wrote:" in prose is not mistaken for one; separators are distinctive
+# enough to match anywhere, which also covers bodies already flattened by clean_text.
+_REPLY_BOUNDARY_PATTERN = re.compile(
+    r'(?P<attribution>'
+    # Gmail, Apple Mail, Thunderbird: "On Thu, Jul 3, 2025 at 10:39 AM Jane <jane@x.com> wrote:"
+    r'\bOn\s[^\n]{0,120}?\d{4}[^\n]{0,160}?(?:\n[^\n]{0,160}?)?\bwrote:'
+    # French, German and Spanish clients
+    r'|\bLe\s[^\n]{0,120}?\d{4}[^\n]{0,160}?\ba\s\xe9crit\s?:'
+    r'|\bAm\s[^\n]{0,120}?\d{4}[^\n]{0,160}?\bschrieb[^\n:]{0,160}:'
+    r'|\bEl\s[^\n]{0,120}?\d{4}[^\n]{0,160}?\bescribi\xf3:'
+    r')'
+    # Outlook header block and separators, forwards
+    r'|^[ \t]*From:[^\n]*\n[ \t]*(?:Sent|Date):'
+    r'|(?i:-{2,}\s*Original Message\s*-{2,})'
+    r'|(?P<forward>(?i:-{2,}\s*Forwarded message\s*-{2,})'
+    r'|Begin forwarded message:)',
+    re.MULTILINE
+)
+_QUOTED_LINE_PATTERN = re.compile(r'^[ \t]*>[^\n]*\n?', re.MULTILINE)
+_QUOTED_ADDRESS_PATTERN = re.compile(r'<([^<>@\s]+@[^<>\s]+)>|\b([\w.+-]+@[\w-]+(?:\.[\w-]+)+)')
+
+
+def split_reply(text):
+    """
+    Splits a plain-text body into the message's own content and the history it quotes.
+    Returns (novel_text, quoted_text, quoted_from, is_forward): everything from the first
+    attribution line or forward/Outlook separator on is quoted, as are ">" lines above it,
+    quoted_from is the address the history is attributed to ('' when unknown), and
+    is_forward tells whether the history starts at a forward separator.
+    A message with nothing of its own (a bare forward) is returned whole.
+    """
+    boundary = _REPLY_BOUNDARY_PATTERN.search(text)
+    head, history = (text[:boundary.start()], text[boundary.start():]) if boundary else (text, '')
+    interleaved = _QUOTED_LINE_PATTERN.findall(head)
+    if interleaved:
+        head = _QUOTED_LINE_PATTERN.sub('', head)
+    if not head.strip():
+        return text, '', '', False
+
+    quoted_from = ''
+    if boundary:
+        # Attribution lines name the quoted sender; header blocks carry it on the From: line
+        attribution = boundary.group('attribution') or history[:500]
+        address = _QUOTED_ADDRESS_PATTERN.search(attribution)
+        if address:
+            quoted_from = (address.group(1) or address.group(2)).lower()
+    return head, ''.join(interleaved) + history, quoted_from, bool(boundary and boundary.group('forward'))
@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+
+DEFAULT_CACHE_PATH = "message_cache.sqlite3"
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+
+class MessageCache:
+    """
+    Persistent cache of parsed email records keyed by Gmail message id.
+
+    Gmail messages are immutable, so a record only goes stale when the parser changes.
+    Each script caches under its own namespace with a schema version; opening the cache
+    with a different version drops that namespace's old entries. When the stored records
+    exceed max_bytes, the least recently used ones are evicted. path and max_bytes default
+    to MESSAGE_CACHE_PATH and MESSAGE_CACHE_MAX_BYTES, read when the cache is opened so
+    values loaded from .env after import still apply.
+    """
+
+    def __init__(self, namespace, schema_version, path=None, max_bytes=None):
+        self.namespace = namespace
+        self.schema_version = schema_version
+        path = path or os.getenv("MESSAGE_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("MESSAGE_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS messages (
+                namespace TEXT NOT NULL,
+                id TEXT NOT NULL,
+                schema_version INTEGER NOT NULL,
+                record TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, id)
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_accessed ON messages (accessed_at)")
+        deleted = self.conn.execute(
+            "DELETE FROM messages WHERE namespace = ? AND schema_version != ?",
+            (namespace, schema_version)
+        ).rowcount
+        self.conn.commit()
+        if deleted:
+            logging.info(f"Message cache: dropped {deleted} '{namespace}' entries from an older schema version.")
+        # Running size of every stored record, kept up to date by put_many and evict
+        self.total_size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM messages").fetchone()[0]
+
+    def get(self, msg_id):
+        """Returns the cached record for msg_id, or None."""
+        return self.get_many([msg_id]).get(msg_id)
+
+    def get_many(self, msg_ids):
+        """Returns a dict of message id to cached record for every id found."""
+        found = {}
+        msg_ids = list(msg_ids)
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(msg_ids), 500):
+            chunk = msg_ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT id, record FROM messages WHERE namespace = ? AND id IN ({placeholders})",
+                [self.namespace, *chunk]
+            ).fetchall()
+            for msg_id, record in rows:
+                found[msg_id] = json.loads(record)
+        if found:
+            now = time.time()
+            self.conn.executemany(
+                "UPDATE messages SET accessed_at = ? WHERE namespace = ? AND id = ?",
+                [(now, self.namespace, msg_id) for msg_id in found]
+            )
+            self.conn.commit()
+        self.hits += len(found)
+        self.misses += len(msg_ids) - len(found)
+        return found
+
+    def put(self, record):
+        """Stores one parsed record; it must carry its message id under 'id'."""
+        self.put_many([record])
+
+    def put_many(self, records):
+        """Stores parsed records and evicts old entries if the cache grew past max_bytes."""
+        now = time.time()
+        rows = []
+        for record in records:
+            payload = json.dumps(record, ensure_ascii=False)
+            rows.append((self.namespace, record['id'], self.schema_version, payload, len(payload), now))
+        if not rows:
+            return
+        # Replaced records no longer count towards the total
+        for start in range(0, len(rows), 500):
+            chunk = [row[1] for row in rows[start:start + 500]]
+            placeholders = ",".join("?" * len(chunk))
+            self.total_size -= self.conn.execute(
+                f"SELECT COALESCE(SUM(size), 0) FROM messages WHERE namespace = ? AND id IN ({placeholders})",
+                [self.namespace, *chunk]
+            ).fetchone()[0]
+        self.total_size += sum(row[4] for row in rows)
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO messages (namespace, id, schema_version, record, size, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        self.conn.commit()
+        self.evict()
+
+    def evict(self):
+        """Deletes least recently used records until the cache is back under 90% of max_bytes."""
+        if self.total_size <= self.max_bytes:
+            return
+        # Other processes may share the file, so recount before deleting anything
+        total_size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM messages").fetchone()[0]
+        if total_size <= self.max_bytes:
+            self.total_size = total_size
+            return
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        to_delete = []
+        for namespace, msg_id, size in self.conn.execute("SELECT namespace, id, size FROM messages ORDER BY accessed_at"):
+            if total_size <= target:
+                break
+            to_delete.append((namespace, msg_id))
+            total_size -= size
+            removed += 1
+        self.conn.executemany("DELETE FROM messages WHERE namespace = ? AND id = ?", to_delete)
+        self.conn.commit()
+        self.total_size = total_size
+        logging.info(f"Message cache: evicted {removed} least recently used entries.")
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,109 @@
+from collections import Counter
+from email.utils import getaddresses, parsedate_to_datetime
+
+
+def normalize_address(address):
+    """Lower-cases a bare email address and strips surrounding whitespace and brackets."""
+    return (address or '').strip().strip('<>').lower()
+
+
+def email_participants(email_data):
+    """Returns the normalised sender, To and Cc addresses of a parsed email."""
+    participants = {normalize_address(email_data.get('from_email'))}
+    recipients = email_data.get('to_recipients', []) + email_data.get('cc_recipients', [])
+    participants.update(normalize_address(address) for _, address in getaddresses(recipients))
+    participants.discard('')
+    return participants
+
+
+class ParticipantIndex:
+    """
+    Inverted index from participant address to the email threads they appear in.
+
+    Emails are added once during ingestion; each address gets a posting list of thread
+    ids. Meeting-prep lookups then intersect the attendees' posting lists (smallest
+    first) instead of scanning every email for every meeting.
+    """
+
+    def __init__(self, ignored_addresses=()):
+        self.ignored = {normalize_address(address) for address in ignored_addresses}
+        self.postings = {}
+        self.threads = {}
+
+    def __len__(self):
+        return len(self.threads)
+
+    def add(self, email_data):
+        thread_id = email_data['threadId']
+        thread = self.threads.get(thread_id)
+        if thread is None:
+            thread = self.threads[thread_id] = {
+                'thread_id': thread_id,
+                'subject': email_data.get('subject', ''),
+                'last_date': email_data.get('date', ''),
+                'last_epoch': 0,
+                'message_count': 0
+            }
+        thread['message_count'] += 1
+        epoch = email_data.get('timestamp')
+        if epoch is None:
+            try:
+                epoch = parsedate_to_datetime(email_data.get('date', '')).timestamp()
+            except (TypeError, ValueError):
+                epoch = 0
+        if epoch >= thread['last_epoch']:
+            thread.update(subject=email_data.get('subject', ''), last_date=email_data.get('date', ''), last_epoch=epoch)
+
+        for address in email_participants(email_data) - self.ignored:
+            self.postings.setdefault(address, set()).add(thread_id)
+
+    def threads_with_all(self, addresses):
+        """Returns the ids of threads involving every given address."""
+        posting_lists = sorted((self.postings.get(normalize_address(address), set()) for address in addresses), key=len)
+        if not posting_lists:
+            return set()
+        shared = set(posting_lists[0])
+        for posting_list in posting_lists[1:]:
+            if not shared:
+                break
+            shared &= posting_list
+        return shared
+
+    def meeting_context(self, addresses, limit=5):
+        """
+        Returns up to `limit` thread summaries for a meeting's attendees, most recent first.
+        Threads shared by every attendee come first; when there are fewer than `limit` of
+        those, threads ranked by how many attendees they involve fill the rest.
+        """
+        addresses = {normalize_address(address) for address in addresses} - self.ignored
+        addresses.discard('')
+        if not addresses:
+            return []
+
+        def by_recency(thread_id):
+            return self.threads[thread_id]['last_epoch']
+
+        selected = sorted(self.threads_with_all(addresses), key=by_recency, reverse=True)[:limit]
+        if len(selected) < limit and len(addresses) > 1:
+            overlap = Counter()
+            for address in addresses:
+                overlap.update(self.postings.get(address, ()))
+            chosen = set(selected)
+            ranked = sorted(
+                (thread_id for thread_id in overlap if thread_id not in chosen),
+                key=lambda thread_id: (overlap[thread_id], by_recency(thread_id)),
+                reverse=True
+            )
+            selected.extend(ranked[:limit - len(selected)])
+
+        context = []
+        for thread_id in selected:
+            thread = self.threads[thread_id]
+            context.append({
+                'thread_id': thread_id,
+                'subject': thread['subject'],
+                'last_date': thread['last_date'],
+                'message_count': thread['message_count'],
+                'attendees_involved': sorted(address for address in addresses if thread_id in self.postings.get(address, ()))
+            })
+        return context
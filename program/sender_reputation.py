@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import logging
+
+DEFAULT_REPUTATION_PATH = "sender_reputation.json"
+
+# Shared mailbox providers: their domains say nothing about whether a sender is bulk
+WEBMAIL_DOMAINS = {
+    "gmail.com", "googlemail.com", "yahoo.com", "outlook.com", "hotmail.com", "live.com",
+    "icloud.com", "me.com", "aol.com", "proton.me", "protonmail.com", "msn.com"
+}
+
+
+class SenderReputation:
+    """
+    Persistent per-sender and per-domain record of past marketing/bulk verdicts.
+
+    Each entry keeps exponentially decayed counts of bulk and kept messages, so a sender's
+    history fades with a half-life of half_life_days. A sender (or, failing that, a
+    non-webmail domain) with enough recent history that is almost all bulk is reported as
+    confidently bulk, letting triage skip the body download and NLP for it.
+    The ids of recorded messages are kept for message_retention_days, so a message seen
+    again on a later run (from the sync store or the cache) is only counted once.
+    """
+
+    def __init__(self, path=None, half_life_days=30, min_observations=3,
+                 domain_min_observations=10, bulk_ratio=0.95, message_retention_days=90):
+        # Resolved here rather than at import so SENDER_REPUTATION_FILE from .env applies
+        path = self.path = path or os.getenv("SENDER_REPUTATION_FILE", DEFAULT_REPUTATION_PATH)
+        self.half_life_seconds = half_life_days * 86400
+        self.message_retention_seconds = message_retention_days * 86400
+        self.min_observations = min_observations
+        self.domain_min_observations = domain_min_observations
+        self.bulk_ratio = bulk_ratio
+        self.hits = 0
+        self.lookups = 0
+        self.entries = {'senders': {}, 'domains': {}}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                logging.warning(f"Could not load sender reputation from {path}: {e}")
+        self.entries.setdefault('messages', {})
+
+    @staticmethod
+    def _keys(sender_email):
+        sender = (sender_email or '').strip().lower()
+        domain = sender.rpartition('@')[2]
+        return sender, domain if domain and domain not in WEBMAIL_DOMAINS else None
+
+    def _decayed(self, entry, now):
+        factor = 0.5 ** (max(0, now - entry['updated']) / self.half_life_seconds)
+        return entry['bulk'] * factor, entry['kept'] * factor
+
+    def _verdict(self, entry, min_observations, now):
+        """Returns True/False when the entry has at least min_observations, else None."""
+        if entry is None:
+            return None
+        bulk, kept = self._decayed(entry, now)
+        if bulk + kept < min_observations:
+            return None
+        return bulk >= self.bulk_ratio * (bulk + kept)
+
+    def is_bulk(self, sender_email, now=None):
+        """
+        Returns True when the sender is confidently bulk; the domain is only consulted when
+        the sender itself has too little history. Counts the lookup.
+        """
+        now = time.time() if now is None else now
+        sender, domain = self._keys(sender_email)
+        self.lookups += 1
+        confident = self._verdict(self.entries['senders'].get(sender), self.min_observations, now)
+        if confident is None and domain is not None:
+            confident = self._verdict(self.entries['domains'].get(domain), self.domain_min_observations, now)
+        confident = bool(confident)
+        if confident:
+            self.hits += 1
+        return confident
+
+    def record(self, sender_email, is_bulk, message_id=None, now=None):
+        """
+        Adds one classification outcome for the sender and its domain. A message_id that
+        was already recorded is ignored, so re-processed messages do not reinforce their
+        own verdict.
+        """
+        now = time.time() if now is None else now
+        sender, domain = self._keys(sender_email)
+        if not sender:
+            return
+        if message_id is not None:
+            if message_id in self.entries['messages']:
+                return
+            self.entries['messages'][message_id] = now
+        for table, key in (('senders', sender), ('domains', domain)):
+            if key is None:
+                continue
+            entry = self.entries[table].get(key)
+            bulk, kept = self._decayed(entry, now) if entry else (0.0, 0.0)
+            self.entries[table][key] = {
+                'bulk': bulk + (1 if is_bulk else 0),
+                'kept': kept + (0 if is_bulk else 1),
+                'updated': now
+            }
+
+    def hit_rate(self):
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def save(self, now=None):
+        """Drops entries that have decayed away and old message ids, and writes the store atomically."""
+        now = time.time() if now is None else now
+        for table in (self.entries['senders'], self.entries['domains']):
+            for key in [key for key, entry in table.items() if sum(self._decayed(entry, now)) < 0.05]:
+                del table[key]
+        self.entries['messages'] = {
+            message_id: recorded_at for message_id, recorded_at in self.entries['messages'].items()
+            if now - recorded_at < self.message_retention_seconds
+        }
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.error(f"Error saving sender reputation to {self.path}: {e}")
@@ -0,0 +1,121 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+
+DEFAULT_TEMPLATE_PATH = "signature_templates.json"
+
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def normalize_line(line):
+    return _WHITESPACE_PATTERN.sub(' ', line).strip().lower()
+
+
+def suffix_fingerprints(lines, max_lines):
+    """
+    Fingerprints the trailing 1..max_lines non-empty lines of a body, bottom up.
+    Each fingerprint chains the previous one, so all suffixes cost one short hash per
+    line. Returns a list of (fingerprint, line_index) where line_index is the first
+    line of that suffix in `lines`.
+    """
+    fingerprints = []
+    previous = b''
+    for index in range(len(lines) - 1, -1, -1):
+        normalized = normalize_line(lines[index])
+        if not normalized:
+            continue
+        previous = hashlib.blake2b(normalized.encode('utf-8') + b'\n' + previous, digest_size=8).digest()
+        fingerprints.append((previous.hex(), index))
+        if len(fingerprints) == max_lines:
+            break
+    return fingerprints
+
+
+class SignatureTemplates:
+    """
+    Learns each sender's recurring trailing blocks (signatures, legal disclaimers) and
+    strips them from new messages.
+
+    While a sender is being learned, the fingerprints of every trailing suffix of their
+    messages are counted; a suffix seen in min_occurrences messages becomes a template.
+    Each message id is counted once, so a message served again on a later run does not
+    reinforce its own lines. After learn_messages messages the counters are dropped, so
+    learning is paid once per sender and stripping is a few hash lookups. Templates
+    persist in a JSON file.
+    """
+
+    def __init__(self, path=None, min_occurrences=3, learn_messages=20, max_block_lines=15):
+        # Resolved here rather than at import so SIGNATURE_TEMPLATE_FILE from .env applies
+        path = self.path = path or os.getenv("SIGNATURE_TEMPLATE_FILE", DEFAULT_TEMPLATE_PATH)
+        self.min_occurrences = min_occurrences
+        self.learn_messages = learn_messages
+        self.max_block_lines = max_block_lines
+        self.senders = {}
+        self.stripped_lines = 0
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.senders = json.load(f)
+            except Exception as e:
+                logging.warning(f"Could not load signature templates from {path}: {e}")
+
+    def _observe(self, sender, fingerprints, message_id=None):
+        entry = self.senders.setdefault(sender, {'templates': [], 'seen': 0, 'counts': {}})
+        if entry['seen'] >= self.learn_messages:
+            return entry
+        if message_id is not None:
+            observed_ids = entry.setdefault('message_ids', [])
+            if message_id in observed_ids:
+                return entry
+            observed_ids.append(message_id)
+        entry['seen'] += 1
+        counts = entry['counts']
+        templates = set(entry['templates'])
+        for fingerprint, _ in fingerprints:
+            counts[fingerprint] = counts.get(fingerprint, 0) + 1
+            if counts[fingerprint] >= self.min_occurrences:
+                templates.add(fingerprint)
+        entry['templates'] = sorted(templates)
+        if entry['seen'] >= self.learn_messages:
+            entry['counts'] = {}
+            entry.pop('message_ids', None)
+        return entry
+
+    def strip(self, sender_email, text, message_id=None):
+        """
+        Returns text without the sender's longest known trailing template, learning from
+        it first unless message_id was already learned from. A template never removes the
+        whole body.
+        """
+        sender = (sender_email or '').lower()
+        if not sender or not text:
+            return text
+        lines = text.splitlines()
+        fingerprints = suffix_fingerprints(lines, self.max_block_lines)
+        with self.lock:
+            templates = set(self._observe(sender, fingerprints, message_id)['templates'])
+        cut = None
+        for fingerprint, index in fingerprints:
+            if fingerprint in templates:
+                cut = index
+        if cut is None or not any(normalize_line(line) for line in lines[:cut]):
+            return text
+        with self.lock:
+            self.stripped_lines += len(lines) - cut
+        return '\n'.join(lines[:cut])
+
+    def save(self):
+        """Writes the templates atomically."""
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with self.lock:
+                payload = json.dumps(self.senders, ensure_ascii=False)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.error(f"Error saving signature templates to {self.path}: {e}")
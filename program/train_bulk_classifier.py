@@ -0,0 +1,63 @@
+"""
+Trains the bulk-mail classifier used by analyze_consolidated.py's triage and filter stages.
+
+Input files are JSON snapshots of email records (a list, or a dict with an "emails"
+list) in which each labelled record carries a boolean "is_marketing" field; unlabelled
+records are skipped. 20% of the records are held out to report precision and recall.
+
+    python train_bulk_classifier.py labelled_snapshot.json [more.json ...] [--output bulk_classifier.npz] [--threshold 0.9]
+"""
+import os
+import sys
+import json
+import argparse
+
+import numpy as np
+
+from bulk_classifier import BulkMailClassifier
+
+
+def load_labelled_records(paths, label_field):
+    records = []
+    labels = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get('emails', [])
+        for record in data:
+            if isinstance(record.get(label_field), bool):
+                records.append(record)
+                labels.append(record[label_field])
+    return records, np.array(labels, dtype=bool)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the bulk-mail classifier from labelled snapshots.")
+    parser.add_argument('snapshots', nargs='+')
+    parser.add_argument('--output', default=os.getenv("BULK_CLASSIFIER_MODEL", "bulk_classifier.npz"))
+    parser.add_argument('--label-field', default='is_marketing')
+    parser.add_argument('--threshold', type=float, default=float(os.getenv("BULK_CLASSIFIER_THRESHOLD", 0.9)))
+    args = parser.parse_args()
+
+    records, labels = load_labelled_records(args.snapshots, args.label_field)
+    if len(records) < 10 or labels.all() or not labels.any():
+        sys.exit(f"Need at least 10 labelled records of both classes, got {len(records)} ({int(labels.sum())} marketing).")
+
+    order = np.random.default_rng(0).permutation(len(records))
+    held_out = order[:len(records) // 5]
+    training = order[len(records) // 5:]
+    model = BulkMailClassifier.train([records[i] for i in training], labels[training])
+    scores = model.score_batch([records[i] for i in held_out])
+    for name, predicted in (('drop', scores >= args.threshold), ('keep', scores <= 1 - args.threshold)):
+        expected = labels[held_out] if name == 'drop' else ~labels[held_out]
+        precision = (predicted & expected).sum() / max(1, predicted.sum())
+        recall = (predicted & expected).sum() / max(1, expected.sum())
+        print(f"held-out confident {name}: precision {precision:.3f}, recall {recall:.3f}")
+
+    BulkMailClassifier.train(records, labels).save(args.output)
+    print(f"Trained on {len(records)} records ({int(labels.sum())} marketing), saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()